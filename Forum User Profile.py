@@ -9,8 +9,9 @@
 # 
 # This notebook automatically collects data from a user profile using webscraping techniques and based on the collected data it visualizes basic statistics of the participation of this user in the Odoo Community Forum AKA Odoo Help Forum. A pie chart and a calendar heatmap per calendar year (similar to GitHub's contributions plot) are visualization tools employed in this notebook for visualizing the statistics of the user activity.
 # 
-# In order for this notebook to work, the file `secret.json` must be placed in the same directory as this notebook and it must contain the user credentials required to login into the Odoo Community Forum website (i.e. email and password) and the user ID from the Odoo Community Forum (the user ID can be seen in the URL of the user profile page of the forum).
+# The steps of the collection, aggregation and plotting are implemented in the `odoo_forum_profile` package next to this notebook, which can also run them without Jupyter using the `odoo-forum-profile` command (see the `README.md`).
 # 
+# In order for this notebook to work, the file `secret.json` must be placed in the same directory as this notebook and it must contain the user credentials required to login into the Odoo Community Forum website (i.e. email and password) and the user ID from the Odoo Community Forum (the user ID can be seen in the URL of the user profile page of the forum).
 
 # In[1]:
 
@@ -30,32 +31,77 @@ get_ipython().run_cell_magic('HTML', '', '<style>\n@media (max-width: 540px) {\n
 
 
 import pandas as pd
-import numpy as np
 import requests
 from bs4 import BeautifulSoup
 import urllib
 import matplotlib.pyplot as plt
 import seaborn as sns
-import calplot
-import time
 from pathlib import Path
 import json
 import io
 import sys
 from contextlib import redirect_stderr
-from IPython.display import clear_output
+from IPython.display import clear_output, Image, SVG
+
+from odoo_forum_profile.aggregate import (
+    count_daily_events, count_summary, load_post_times, to_datetime,
+    update_rollups)
+from odoo_forum_profile.collect import (
+    PostRecords, ProfilePage, collect_question_pages, collect_question_posts,
+    extract_activity,
+    extract_answer_urls, extract_badges, extract_profile,
+    extract_question_card_urls, extract_votes, index_answers,
+    is_logged_in, list_page_urls, load_previous_records, log_in,
+    plan_page_urls, prepare_user_data_dir, question_page_strainer,
+    restore_session, save_session, session_path, uncollected_page_urls,
+    write_answers, write_related_questions)
+from odoo_forum_profile.database import SQLiteStore
+from odoo_forum_profile.fetch import (
+    Fetcher, HTTPCache, RateLimiter, SharedRateLimiter)
+from odoo_forum_profile.metrics import Metrics
+from odoo_forum_profile.plot import FigureCache, calendar_figures, plot_summary
+from odoo_forum_profile.records import to_json
+from odoo_forum_profile.rollup import RollupStore
+from odoo_forum_profile.rpc import JSONRPCClient
+from odoo_forum_profile.storage import BlobStore, JSONLStore, write_post_tables
 
 
 # In[4]:
 
 
+USER_ID = None  # the "user_id" from the `secret.json` by default
 VERBOSE = False
 QUICK_DEBUG_RUN = False
+INCREMENTAL_SYNC = False
+RESUME = False  # continue the interrupted collection
+HTML_PARSER = "lxml"  # or "html.parser"
+PARTIAL_PARSING = True  # parse only the posts of the question pages
+DATA_SOURCE = "html"  # or "jsonrpc", read the posts via JSON-RPC
+COLUMNAR_FORMAT = None  # or "parquet" / "feather", requires pyarrow
+SQLITE_DATABASE = None  # e.g. "data/forum.sqlite", shared by the users
+FIGURE_FORMAT = "png"  # or "svg", format of the cached figures
+HEADLESS_RENDERING = False  # render the figures into files in parallel
+RENDER_WORKERS = None  # worker processes, the number of CPUs by default
+FIGURE_CACHE_MAX_SIZE = 256 * 1024**2  # bytes
 
 
 # In[5]:
 
 
+MAX_CONCURRENT_REQUESTS = 4
+START_REQUESTS_PER_SECOND = 0.5  # shared by all the sections
+REQUESTS_PER_SECOND_RANGE = (0.1, 2)  # floor and ceiling of the rate, be kind
+SLOW_RESPONSE = 2  # seconds, the rate slows down on slower responses
+RETRIES = 3  # of a request failed by a connection or a server error
+RATE_LIMIT_FILE = None  # share the budget with other processes via file
+HTTP_CACHE_MAX_AGE = timedelta(hours=12)  # older pages are revalidated
+HTTP_CACHE_MAX_SIZE = 1024**3  # bytes
+REFRESH_SAMPLE_SIZE = 20  # previously collected pages refreshed per sync
+
+
+# In[6]:
+
+
 import importlib
 
 if importlib.util.find_spec('ipywidgets') is not None:
@@ -66,12 +112,24 @@ else:
     if VERBOSE:
         print("No ipywidgets found, using simple tqdm.")
 
+if HTML_PARSER == "lxml" and importlib.util.find_spec('lxml') is None:
+    HTML_PARSER = "html.parser"
+
+    if VERBOSE:
+        print("No lxml found, using html.parser.")
+
+if COLUMNAR_FORMAT is not None and importlib.util.find_spec('pyarrow') is None:
+    COLUMNAR_FORMAT = None
+
+    if VERBOSE:
+        print("No pyarrow found, saving JSON files only.")
+
 
 # # Collect data from the user account via webscraping
 # 
 # Based on the User ID and credentials provided in the `secret.json` login into the user account. Once we are logged into the users account, we have access to all its data. we collect information from the profile and save the collected data locally into the JSON files under the directory named after the User ID in the local `data` directory.
 
-# In[6]:
+# In[7]:
 
 
 with open("secret.json", "r") as f:
@@ -85,39 +143,29 @@ if (any([k not in s for k in ["user_id", "email", "password"]])
     raise Exception("Please provide your credentials first!")    
 
 
-# In[7]:
+# In[8]:
 
 
-USER_ID = s["user_id"]
+if USER_ID is None:
+    USER_ID = s["user_id"]
 
 
-# In[8]:
+# In[9]:
 
 
 USER_EMAIL, USER_PASSWORD = s["email"], s["password"]
 
 
-# In[9]:
+# In[10]:
 
 
 user_data_dir = Path.cwd() / "data" / str(USER_ID)
 
 
-# In[10]:
+# In[11]:
 
 
-if user_data_dir.is_dir():
-    
-    for f in user_data_dir.rglob("*"):
-        try:
-            f.unlink()
-        except IsADirectoryError:
-            pass
-        
-    for f in user_data_dir.rglob("*"):
-        f.rmdir()
-else:
-    user_data_dir.mkdir(parents=True)
+prepare_user_data_dir(user_data_dir, keep=INCREMENTAL_SYNC or RESUME)
 
 if VERBOSE:
     print("Local directory of the user data:",
@@ -127,8 +175,10 @@ if VERBOSE:
 # ## Login into the User Account
 # 
 # Login into the account and simultaneously go to the profile page by sending a POST request containing the `redirect` key with the desired URI which is undersood by the Odoo backend and it takes us directly to the users profile page.
+# 
+# The cookies of the logged in session are saved into the `data/.sessions` directory (readable by the owner only) and reused by the subsequent runs: if the profile page requested with the saved cookies shows that we are still logged in, the login is skipped altogether, otherwise we login again.
 
-# In[11]:
+# In[12]:
 
 
 base_URL = "https://www.odoo.com"
@@ -141,65 +191,43 @@ login_payload = {
 }
 
 
-# In[12]:
-
-
-session = requests.Session()
-
-
 # In[13]:
 
 
-def raise_on_failure(response, silent=False):
-    status_msg = f"HTTP response status code: {response.status_code}"
+metrics = Metrics()  # timings and counters of the run, see the last cell
 
-    if not response.ok:
-        raise Exception(status_msg)
-    elif VERBOSE and not silent:
-        print(status_msg)
-    return response
-
-response = raise_on_failure(session.get(login_URL))
+session = requests.Session()
+session.mount(base_URL, requests.adapters.HTTPAdapter(
+    pool_maxsize=MAX_CONCURRENT_REQUESTS))
+session.hooks["response"].append(metrics.record_response)
 
 
 # In[14]:
 
 
-soup = BeautifulSoup(response.text)
-
-
-# In[15]:
-
-
-csrf_input = (soup
-              .find("form", {"action": "/web/login", "method": "post"})
-              .find("input", {"name": "csrf_token"})
-             )
-
-
-# In[16]:
-
-
-login_payload['csrf_token'] = csrf_input.get("value")
-
-
-# In[17]:
+session_file = session_path(Path.cwd() / "data", USER_EMAIL)
+profile_URL = urllib.parse.urljoin(base_URL, login_payload["redirect"])
 
+with metrics.stage("login"):
+    soup = restore_session(session, session_file, profile_URL, HTML_PARSER,
+                           VERBOSE)
 
 if VERBOSE:
-    display({k:login_payload[k] for k in login_payload if k != "password"})
-
-
-# In[18]:
+    print("Reusing the saved session." if soup is not None
+          else "No valid saved session, logging in.")
 
 
-response = raise_on_failure(session.post(login_URL, data=login_payload))
+# In[15]:
 
 
-# In[19]:
+if soup is None:
+    with metrics.stage("login"):
+        response = log_in(session, login_URL, login_payload, HTML_PARSER,
+                          VERBOSE)
+        soup = BeautifulSoup(response.text, HTML_PARSER)
 
-
-soup = BeautifulSoup(response.text)
+    if is_logged_in(soup):
+        save_session(session, session_file)
 
 
 # ## Collect data of User Profile
@@ -222,125 +250,27 @@ soup = BeautifulSoup(response.text)
 # - Next rank icon URL
 # - Next rank progress (%)
 # 
+# The profile page is walked once by the `ProfilePage` of the `odoo_forum_profile.collect` module, which finds the elements of its sections (the header, the sidebar, the biography, the badges, the questions, the answers, the activity and the votes) for the parsers of the sections below. Each parser searches just its own section, with the selectors compiled once.
+# 
 # Data collected in this section is saved locally into the `data/"User ID"/user_profile.json` file.
 
-# In[20]:
-
-
-def add_scheme_to_url(url):
-    return urllib.parse.urlunparse(urllib.parse.urlparse(url, scheme="https"))
-
-
-# In[21]:
-
-
-user_profile = {
-    "ID": USER_ID,
-    "Name": "",
-    "Website": "",
-    "Email": USER_EMAIL,
-    "City": "",
-    "Country": "",
-    "Biography": "",
-}
-
-
-# In[22]:
-
+# In[16]:
 
-user_profile["Name"] = soup.select(
-    ".o_wprofile_header .o_card_people_name")[0].text.strip()
 
-try:
-    user_profile["Website"] = soup.select(
-        ".o_wprofile_header i.fa-globe")[0].parent.text.strip()
-except IndexError as e:
-    user_profile["Website"] = None
-
-try:
-    location_entries = soup.select(
-        ".o_wprofile_header i.fa-map-marker")[0].find_next_siblings()
-    
-    if len(location_entries) > 0:
-        user_profile["City"] = location_entries[0].text.strip()
-    else:
-        user_profile["City"] = None
-    
-    if len(location_entries) > 1:
-        user_profile["Country"] = location_entries[1].find("span").text.strip()
-    else:
-        user_profile["Country"] = None
-except IndexError as e:
-    user_profile["City"] = None
-    user_profile["Country"] = None
-
-try:
-    user_profile["Biography"] = soup.find("h5",
-                                          string="Biography"
-                                         ).find_next_sibling()
-    
-    if len(user_profile["Biography"].text.strip()) > 0:
-        user_profile["Biography"] = str(user_profile["Biography"])
-    else:
-        user_profile["Biography"] = None
-except Exception as e:
-    user_profile["Biography"] = None
-
-
-user_profile["Current rank"] = soup.select(
-    ".o_wprofile_sidebar .o_wprofile_sidebar_top a")[0].text.strip()
-
-user_profile["Current rank icon"] = add_scheme_to_url(
-    soup.select(
-        ".o_wprofile_sidebar .o_wprofile_sidebar_top img")[0].get("src"))
-
-user_profile["Joined"] = soup.select(
-    "table#o_wprofile_sidebar_table")[0].find("th",
-                                              string="Joined"
-                                             ).find_next_sibling().text.strip()
-
-
-(
-    user_profile["Positive votes"],
-    user_profile["Negative votes"],
-) = soup.select(
-    "table#o_wprofile_sidebar_table"
-)[0].find("th", string="Votes").find_next_sibling().text.strip().split()
-
-(
-    user_profile["Next rank"],
-    user_profile["Current xp"],
-    _,
-    user_profile["Next rank xp"],
-    _,
-) = soup.select(
-    "#o_wprofile_sidebar_collapse .o_wprofile_progress_circle")[0].text.split()
-
-for key in ("Current xp", "Next rank xp", "Positive votes", "Negative votes"):
-    user_profile[key] = int(user_profile[key].replace(",", ""))
-    
-user_profile["Next rank progress"] = (
-    user_profile["Current xp"] / user_profile["Next rank xp"] * 100
-)
-user_profile["Next rank icon"] = add_scheme_to_url(
-    soup.select(
-        "#o_wprofile_sidebar_collapse .o_wprofile_progress_circle img"
-    )[0].get("src")
-)
-user_profile["Avatar image"] =  add_scheme_to_url(
-    soup.select_one(
-        ".o_wprofile_pict").get("style").split("url(")[1].split(")")[0])
+with metrics.stage("profile"):
+    profile_page = ProfilePage(soup)
+    user_profile = extract_profile(profile_page, USER_ID, USER_EMAIL)
 
 if VERBOSE:
     display(user_profile)
 
 
-# In[23]:
+# In[17]:
 
 
 profile_data_file = user_data_dir/"user_profile.json"
 with open(profile_data_file, "w") as f:
-    f.write(json.dumps(user_profile))
+    f.write(to_json(user_profile))
 
 if VERBOSE:
     print(f"Saved profile data into the \"{profile_data_file.relative_to(Path.cwd())}\"")
@@ -354,25 +284,22 @@ if VERBOSE:
 # 
 # Data collected in this section is saved locally into the `data/"User ID"/user_badges.json` file.
 
-# In[24]:
+# In[18]:
 
 
-user_badges = [{
-    "badge_url": add_scheme_to_url(badge.find("img").get("src")),
-    "badge_name": badge.text.strip()
-}
-    for badge in soup.select("#profile_about_badge .card")]
+with metrics.stage("profile"):
+    user_badges = extract_badges(profile_page)
 
 if VERBOSE:
     print(f"\nUser has {len(user_badges)} badges:\n")
     display(user_badges)
 
 
-# In[25]:
+# In[19]:
 
 
 with open(user_data_dir/"user_badges.json", "w") as f:
-    f.write(json.dumps(user_badges))
+    f.write(to_json(user_badges))
 
 
 # ## Collet data of Questions
@@ -391,57 +318,153 @@ with open(user_data_dir/"user_badges.json", "w") as f:
 # 
 # 
 # Data collected in this section is saved locally into the `data/"User ID"/related_questions.json` file.
+# 
+# Question pages are downloaded concurrently by at most `MAX_CONCURRENT_REQUESTS` parallel requests, while all the sections together are kept within a budget of requests per second. The rate starts at `START_REQUESTS_PER_SECOND` and adapts to the server within the floor and the ceiling of `REQUESTS_PER_SECOND_RANGE`: it grows while the responses are fast and successful, and it is halved on responses slower than `SLOW_RESPONSE` seconds and on the "429 Too Many Requests" and "503 Service Unavailable" responses, after which no request is sent for the time asked by their `Retry-After` header. Set both bounds to the same rate in order to keep it fixed. Each question page is fetched and parsed only once, even if it is referenced by several sections or answers, and the extracted data is kept in the `question_pages` store (keyed by the URL of the question without the fragment) which is shared with the section of Answers below. Unless `PARTIAL_PARSING` is disabled, only the elements of the posts (i.e. the question `article`, the answers and their votes) are parsed out of the question pages.
+# 
+# With the `DATA_SOURCE` set to `"jsonrpc"` the question pages are not downloaded at all. Instead, the posts (i.e. the questions and the answers of the user) are read as `forum.post` records through the JSON-RPC endpoint of the website at `base_URL`, using the session logged in above, a single call per 100 question pages. The calls are retried like the requests of the question pages, and the pages whose posts could not be read get a follow-up pass as well. Their dates, votes, titles and acceptance are the same as on the pages, while their contents come without the element wrapping them on the pages.
+# 
+# The data extracted from each question page is appended to the `data/"User ID"/question_pages.jsonl` file as soon as the page is processed, and its URL is recorded in the accompanying `question_pages.checkpoint` file. If the collection gets interrupted, run the notebook again with `RESUME` enabled in order to continue from the last completed page. A completed page is collected again if the profile got another answer on it in the meantime.
+# 
+# Requests failed by a connection error or by a transient server error (429, 500, 502, 503 or 504) are retried up to `RETRIES` times after an exponentially growing, randomly jittered delay. A page failing even then, or lacking one of the posts wanted from it (e.g. an answer removed by a moderator), does not stop the collection of the others: it is fetched once more by a follow-up pass after all the others, and if it still fails it is left out of the collected data and listed along with its error in the `data/"User ID"/failures.json` file. Run the notebook again with `RESUME` or `INCREMENTAL_SYNC` enabled in order to collect just the failed pages.
+# 
+# When the `INCREMENTAL_SYNC` mode is enabled, the data collected by the previous run is kept and only the pages of the questions and answers which are new on the profile page are fetched, along with a rotating sample of `REFRESH_SAMPLE_SIZE` previously collected pages in order to refresh their votes. The rest is taken over from the previous run.
+# 
+# Downloaded pages are kept in the HTTP cache under the `data/.http_cache` directory across the runs. Pages cached less than `HTTP_CACHE_MAX_AGE` ago are reused as they are, older ones are revalidated with the server using their `ETag`/`Last-Modified` headers, and the pages cached or revalidated the longest time ago are evicted once the cache grows beyond `HTTP_CACHE_MAX_SIZE` bytes. The data extracted from a cached page is cached as well, so a page which has not changed on the server is not parsed again.
+# 
+# The HTML contents of the posts are not stored in the records themselves. Each distinct content is saved once, gzip compressed, into the `data/"User ID"/post_contents` directory under its SHA-256 hash, and the records hold just the hash in the `content_hash` field, so the content of a question referenced by several sections or answers is not repeated. Use `post_contents.get(content_hash)` to get the HTML back.
 
-# In[26]:
+# In[20]:
 
 
-related_questions = {}
+http_cache = HTTPCache(Path.cwd() / "data" / ".http_cache",
+                       HTTP_CACHE_MAX_AGE, HTTP_CACHE_MAX_SIZE)
 
 
-for question_section in soup.select("#questions >*"):
-    section_name = question_section.select_one("h5:first-child").text.strip()
-    related_questions[section_name] = []
-    question_cards = question_section.select(".card")
-    
-    for q in tqdm(question_cards, desc=f'Section of "{section_name}"',
-                  total=len(question_cards), dynamic_ncols=True, miniters=1):
-        time.sleep(np.random.randint(1, 4))  # rate limit just in case, be kind
-        q_url = urllib.parse.urljoin(base_URL, q.select_one("a").get("href"))
-        response = raise_on_failure(session.get(q_url), silent=True)
-        q_soup = BeautifulSoup(response.text)
-        related_questions[section_name].append({
-            "URL": q_url,
-            "time": q_soup.select_one("article time").text.strip(),
-            "votes": int(q_soup.select_one(".vote_count").text.strip()),
-            "title": q_soup.select_one("article header").text.strip(),
-            "content": str(
-                q_soup.select_one("article .o_wforum_post_content")),
-        })
-        if QUICK_DEBUG_RUN:
-            break
-    if QUICK_DEBUG_RUN:
-        break
-
-if not VERBOSE:
+# In[21]:
+
+
+post_contents = BlobStore(user_data_dir/"post_contents")
+
+
+# In[22]:
+
+
+if RATE_LIMIT_FILE is None:
+    rate_limiter = RateLimiter(START_REQUESTS_PER_SECOND,
+                               REQUESTS_PER_SECOND_RANGE, SLOW_RESPONSE)
+else:
+    rate_limiter = SharedRateLimiter(
+        START_REQUESTS_PER_SECOND, RATE_LIMIT_FILE, REQUESTS_PER_SECOND_RANGE,
+        SLOW_RESPONSE)
+
+fetcher = Fetcher(session, http_cache, rate_limiter, MAX_CONCURRENT_REQUESTS,
+                  progress=tqdm, metrics=metrics, retries=RETRIES)
+
+
+# In[23]:
+
+
+question_card_urls = extract_question_card_urls(profile_page, base_URL)
+answer_urls = extract_answer_urls(profile_page, base_URL)
+
+if QUICK_DEBUG_RUN:
+    question_card_urls = {section_name: q_urls[:1] for section_name, q_urls
+                          in list(question_card_urls.items())[:1]}
+    answer_urls = answer_urls[:1]
+
+answer_html_ids = index_answers(answer_urls, base_URL)
+all_page_urls = list_page_urls(question_card_urls, answer_html_ids, base_URL)
+
+
+# In[24]:
+
+
+previous_questions = {}  # URL -> record collected by the previous run
+previous_answers = {}
+sync_state = {"refresh_offset": 0}
+
+if INCREMENTAL_SYNC:
+    previous_questions, previous_answers, sync_state = (
+        load_previous_records(user_data_dir, post_contents))
+
+new_page_urls, refresh_page_urls = plan_page_urls(
+    all_page_urls, question_card_urls, answer_urls, previous_questions,
+    previous_answers, sync_state, REFRESH_SAMPLE_SIZE, base_URL)
+
+page_urls = [url for url in all_page_urls
+             if url in new_page_urls or url in refresh_page_urls]
+
+if VERBOSE and INCREMENTAL_SYNC:
+    print(f"New question pages: {len(new_page_urls)}, "
+          f"refreshed: {len(refresh_page_urls)}, "
+          f"kept from the previous run: "
+          f"{len(all_page_urls) - len(new_page_urls) - len(refresh_page_urls)}")
+
+
+# In[25]:
+
+
+question_pages = JSONLStore(user_data_dir/"question_pages.jsonl", resume=RESUME)
+uncollected_urls = uncollected_page_urls(page_urls, answer_html_ids,
+                                         question_pages)
+
+with metrics.stage("question pages"):
+    if DATA_SOURCE == "jsonrpc":
+        collect_question_posts(
+            JSONRPCClient(session, base_URL, rate_limiter, metrics, RETRIES),
+            uncollected_urls, answer_html_ids, question_pages, post_contents,
+            fetcher.failures)
+    else:
+        collect_question_pages(
+            fetcher, uncollected_urls, answer_html_ids, question_pages,
+            post_contents, HTML_PARSER,
+            question_page_strainer(PARTIAL_PARSING), metrics)
+
+with open(user_data_dir/"failures.json", "w") as f:
+    f.write(json.dumps([{"URL": url, "error": error}
+                        for url, error in fetcher.failures.items()]))
+
+if INCREMENTAL_SYNC:
+    with open(user_data_dir/"sync_state.json", "w") as f:
+        f.write(json.dumps(sync_state))
+
+if VERBOSE:
+    print(f"Collected {len(question_pages)} question pages for "
+          f"{sum(map(len, question_card_urls.values()))} question cards "
+          f"and {len(answer_urls)} answer cards.")
+else:
     clear_output()
 
+if fetcher.failures:
+    print(f"Failed to collect {len(fetcher.failures)} question pages, see "
+          "failures.json. Run the notebook again with RESUME or "
+          "INCREMENTAL_SYNC enabled in order to collect just them.")
+
+
+# In[26]:
+
+
+post_records = PostRecords(question_pages, previous_questions,
+                           previous_answers, base_URL)
+
 
 # In[27]:
 
 
 if VERBOSE:
-    print("Number of related questions:", len(soup.select("#questions .card")))
+    print("Number of related questions:",
+          len(profile_page.questions.select(".card")))
 
 
 # In[28]:
 
 
 if VERBOSE:
-    for section_name in  related_questions:
-        print(f"\n{section_name} ({len(related_questions[section_name])}):\n")
+    for section_name in  question_card_urls:
+        print(f"\n{section_name} ({len(question_card_urls[section_name])}):\n")
         
-        if len(related_questions[section_name]) > 0:
-            display(related_questions[section_name][0])
+        if len(question_card_urls[section_name]) > 0:
+            display(post_records.question(question_card_urls[section_name][0]))
         else:
             print("This section is empty.")
 
@@ -449,8 +472,9 @@ if VERBOSE:
 # In[29]:
 
 
-with open(user_data_dir/"related_questions.json", "w") as f:
-    f.write(json.dumps(related_questions))
+with metrics.stage("related questions"):
+    write_related_questions(user_data_dir/"related_questions.json",
+                            question_card_urls, post_records)
 
 
 # ## Collect data of Answers
@@ -474,59 +498,33 @@ with open(user_data_dir/"related_questions.json", "w") as f:
 # In[30]:
 
 
-answers = []
-answer_cards = soup.select("#answers .card")
-
 if VERBOSE:
-    print("Number of answers:", len(answer_cards))
-
-for a in tqdm(answer_cards, desc='Answers',
-              total=len(answer_cards), dynamic_ncols=True, miniters=1):
-    time.sleep(np.random.randint(1, 4))  # rate limit just in case, be kind
-    a_url = urllib.parse.urljoin(base_URL, a.select_one("a").get("href"))
-    a_html_id = "#{}".format(
-        urllib.parse.urlparse(a_url).fragment.replace("-","_"))
-    response = raise_on_failure(session.get(a_url), silent=True)
-    q_soup = BeautifulSoup(response.text)
-    a_soup = q_soup.select_one(a_html_id)
-    answers.append({
-        "URL": a_url,
-        "time": a_soup.select_one("time").text.strip(),
-        "votes": int(a_soup.select_one(".vote_count").text.strip()),
-        "accepted": "o_wforum_answer_correct" in a_soup.attrs["class"],
-        "content": str(a_soup.select_one(".o_wforum_readable")),
-        "answered_question": {
-            "time": q_soup.select_one("article time").text.strip(),
-            "votes": int(q_soup.select_one(".vote_count").text.strip()),
-            "title": q_soup.select_one("article header").text.strip(),
-            "content": str(
-                q_soup.select_one("article .o_wforum_post_content")),
-        }
-    })
-    if QUICK_DEBUG_RUN:
-        break
-
-if not VERBOSE:
-    clear_output()
+    print(f"\nAnswers ({len(answer_urls)}):\n")
+
+    if len(answer_urls) > 0:
+        display(post_records.answer(answer_urls[0]))
+    else:
+        print("This user has not answered any question.")
 
 
 # In[31]:
 
 
-if VERBOSE:
-    print(f"\nAnswers ({len(answers)}):\n")
+with metrics.stage("answers"):
+    write_answers(user_data_dir/"answers.json", answer_urls, post_records)
 
-    if len(answers) > 0:
-        display(answers[0])
-    else:
-        print("This user has not answered any question.")
 
+# ## Save Questions and Answers in Columnar Format
+# 
+# Optionally (see `COLUMNAR_FORMAT`) the collected questions and answers are also saved as flat `questions` and `answers` tables in the Parquet or Feather format, one row per question card or answer. The tables hold only the small metadata columns (URL, time, votes, accepted, title) along with the hashes of the contents in the `post_contents` store, so the analysis can load just the few columns it needs.
 
 # In[32]:
 
 
-with open(user_data_dir/"answers.json", "w") as f:
-    f.write(json.dumps(answers))
+if COLUMNAR_FORMAT is not None:
+    with metrics.stage("columnar tables"):
+        write_post_tables(user_data_dir, COLUMNAR_FORMAT, question_card_urls,
+                          answer_urls, post_records)
 
 
 # ## Collect data of Activity
@@ -543,22 +541,14 @@ with open(user_data_dir/"answers.json", "w") as f:
 
 
 if VERBOSE:
-    print(len(soup.select("#activity .card")))
+    print(len(profile_page.activity.select(".card")))
 
 
 # In[34]:
 
 
-activity = [
-    {
-        "type": a.select_one(".card-body span:nth-child(1)").text,
-        "time": a.select_one(".card-body span:nth-child(2)").text,
-        "URL": urllib.parse.urljoin(
-            base_URL,
-            a.select_one(".card-body span:nth-child(3) a").get("href")),
-    }
-    for a in soup.select("#activity .card")
-]
+with metrics.stage("activity"):
+    activity = extract_activity(profile_page, base_URL)
 
 if VERBOSE:
     display(activity[:10])
@@ -568,7 +558,7 @@ if VERBOSE:
 
 
 with open(user_data_dir/"activity.json", "w") as f:
-    f.write(json.dumps(activity))
+    f.write(to_json(activity))
 
 
 # ## Collect data of Votes Given
@@ -588,21 +578,14 @@ with open(user_data_dir/"activity.json", "w") as f:
 
 
 if VERBOSE:
-    print(len(soup.select("#votes >div >div")))
+    print(len(profile_page.votes.select(":scope >div >div")))
 
 
 # In[37]:
 
 
-votes = [
-    {
-        "time": next(v.children).strip(),
-        "is_positive": "fa-thumbs-up" in v.select_one("span").attrs["class"],
-        "title": v.select_one("a").text.strip(),
-        "URL": urllib.parse.urljoin(base_URL, v.select_one("a").get("href"))
-    }
-    for v in soup.select("#votes >div >div") if v.select_one("span")
-]
+with metrics.stage("votes"):
+    votes = extract_votes(profile_page, base_URL)
 
 if VERBOSE:
     display(votes[:10])
@@ -612,7 +595,21 @@ if VERBOSE:
 
 
 with open(user_data_dir/"votes.json", "w") as f:
-    f.write(json.dumps(votes))
+    f.write(to_json(votes))
+
+
+# ## Save into the SQLite database
+# 
+# When `SQLITE_DATABASE` is set, the data collected above is also saved into that SQLite database, along with the data of the other users saved into it before. Its tables of the users, questions, answers, activity, votes and badges are indexed by the user, the URL and the time, and the questions and answers are upserted by their URL.
+
+# In[39]:
+
+
+if SQLITE_DATABASE is not None:
+    with metrics.stage("database"):
+        sqlite_store = SQLiteStore(SQLITE_DATABASE)
+        sqlite_store.save_user_data(user_data_dir)
+        sqlite_store.close()
 
 
 # # Visualize User Participation Data
@@ -624,301 +621,297 @@ with open(user_data_dir/"votes.json", "w") as f:
 # - Number of questions per day (calendar heatmap)
 # - Number of answers per day (calendar heatmap)
 # - Number of various activities combined per day (calendar heatmap)
+# 
+# Just the times of the collected questions and answers are loaded back, from the JSON files saved above or from the time columns alone of the columnar tables when `COLUMNAR_FORMAT` is set.
+# 
+# The rendered figures are cached in the `data/.figure_cache` directory under the hash of the data and the options they are drawn from, along with the Matplotlib style (e.g. the seaborn theme) and the versions of the plotting libraries, so a figure whose data and look have not changed since the previous run is shown from the cache without being drawn again. The figures shown the longest time ago are evicted once the cache grows beyond `FIGURE_CACHE_MAX_SIZE` bytes, except those of the current run.
+# 
+# When `HEADLESS_RENDERING` is enabled, the figures are not displayed in the notebook. Instead, they are rendered with the Agg backend by `RENDER_WORKERS` parallel worker processes into the files of the figure cache, each year of the calendar heatmaps spanning several years as a separate figure, and the list of these files is saved into the `data/"User ID"/figures.json` file.
+
+# In[40]:
+
+
+with metrics.stage("aggregate"):
+    question_post_times, answer_post_times = load_post_times(
+        user_data_dir, COLUMNAR_FORMAT)
+
+
+# In[41]:
+
+
+figure_cache = FigureCache(Path.cwd() / "data" / ".figure_cache",
+                           FIGURE_FORMAT, HEADLESS_RENDERING, RENDER_WORKERS,
+                           metrics, FIGURE_CACHE_MAX_SIZE)
+
+
+def show_figures(paths):
+    if not HEADLESS_RENDERING:
+        for path in paths:
+            display(SVG(filename=path) if FIGURE_FORMAT == "svg"
+                    else Image(filename=path))
+
 
 # ## Questions/Answers, Votes Received, Votes Given
 # 
 # Summary of questions/answers, votes received and votes given visualized as pie charts.
 
-# In[39]:
+# In[42]:
 
 
 plt.show()
 sns.set_theme()
 
-fig, ax = plt.subplots(ncols=3, figsize=(6*3,9))
-
-n_questions_asked = len(related_questions["Questions"])
-n_questions_answered = len(answers)
-ax[0].set_title(
-    f"Questions & Answers ({n_questions_asked + n_questions_answered})",
-    fontsize="x-large")
-ax[0].pie([n_questions_asked, n_questions_answered], radius=0.85,
-          colors=sns.color_palette('bright')[0:2], autopct='%.0f%%')
-ax[0].legend(labels=[
-    f"Questions ({n_questions_asked})",
-    f"Answers ({n_questions_answered})",
-], fontsize="medium", loc="upper right")
-
-n_positive_votes_received = user_profile["Positive votes"]
-n_negative_votes_received = user_profile["Negative votes"]
-ax[1].set_title(
-    "Votes Received "
-    f"({n_positive_votes_received + n_negative_votes_received})",
-    fontsize="x-large")
-ax[1].pie([n_positive_votes_received, n_negative_votes_received], radius=0.85,
-          colors=sns.color_palette('bright')[2:4],
-          autopct='%.0f%%')
-ax[1].legend(labels=[
-    f"Positive ({n_positive_votes_received})",
-    f"Negative ({n_negative_votes_received})",
-], fontsize="medium", loc="upper right")
-
-n_positive_votes_given = len([v for v in votes if v["is_positive"]])
-n_negative_votes_given = len([v for v in votes if not v["is_positive"]])
-ax[2].set_title(
-    f"Votes Given ({n_positive_votes_given + n_negative_votes_given})",
-    fontsize="x-large")
-ax[2].pie([n_positive_votes_given, n_negative_votes_given], radius=0.85,
-          colors=sns.color_palette('bright')[2:4], autopct='%.0f%%')
-ax[2].legend(labels=[
-    f"Positive ({n_positive_votes_given})",
-    f"Negative ({n_negative_votes_given})"
-], fontsize="medium", loc="upper right")
-plt.show()
+summary_counts = count_summary(question_post_times, answer_post_times,
+                               user_profile, votes)
+show_figures([figure_cache.figure(plot_summary, summary_counts)])
 
 
-# In[40]:
+# ## Times of Events
+# 
+# All the collected time fields are normalized into `datetime64` series, parsing each source by a single vectorized `pd.to_datetime` call with its format registered in `TIME_FORMATS` of the `odoo_forum_profile.aggregate` module. The time of day is kept wherever the source has it (activity and votes), the calendar heatmaps below count the events per day. The counts of the events per day, ISO week and month are also saved into the `rollups.json` file, counting only the events since the latest one counted by the previous run, for the dashboards which need not parse the collected data (see `RollupStore` of the `odoo_forum_profile.rollup` module).
+
+# In[43]:
 
 
-joined_day = datetime.strptime(user_profile["Joined"], "%d %b %Y").date()
+with metrics.stage("aggregate"):
+    joined_time = to_datetime([user_profile.joined], "Joined")[0]
 
 if VERBOSE:
-    print("User Joined on: ", joined_day)
+    print("User Joined on: ", joined_time.date())
 
 
-# In[41]:
-
+# In[44]:
 
-related_question_days = {}
 
-for section_name in  related_questions:
-    related_question_days[section_name] = []
-    for q in related_questions[section_name]:
-        related_question_days[section_name].append(
-            datetime.strptime(q["time"], "%d %B %Y").date())
+with metrics.stage("aggregate"):
+    related_question_times = {
+        section_name: to_datetime(section_times, "posts")
+        for section_name, section_times in question_post_times.items()
+    }
 
 
-# In[42]:
+# In[45]:
 
 
 if VERBOSE:
-    for section_name in  related_questions:
+    for section_name in  related_question_times:
         print(
-            f"\nDays of {section_name} "
-            f"({len(related_question_days[section_name])}):\n")
+            f"\nTimes of {section_name} "
+            f"({len(related_question_times[section_name])}):\n")
         
-        if len(related_question_days[section_name]) > 0:
-            display(related_question_days[section_name][0])
+        if len(related_question_times[section_name]) > 0:
+            display(related_question_times[section_name][0])
         else:
             print("This section is empty.")
 
 
-# In[43]:
-
+# In[46]:
 
-answer_days = []
 
-for answer in answers:
-    answer_days.append(datetime.strptime(answer["time"], "%d %B %Y").date())
+with metrics.stage("aggregate"):
+    answer_times = to_datetime(answer_post_times, "posts")
 
 
-# In[44]:
+# In[47]:
 
 
 if VERBOSE:
-    print(f"\nDays of Answers:\n")
+    print(f"\nTimes of Answers:\n")
 
-    if len(answer_days) > 0:
-        display(answer_days[0])
+    if len(answer_times) > 0:
+        display(answer_times[0])
     else:
         print("This user has not answered any question.")
 
 
-# In[45]:
-
+# In[48]:
 
-other_activity_days = []
 
-for a in [x for x in activity if "New" not in x["type"]]:
-    other_activity_days.append(
-        datetime.strptime(a["time"], "%m/%d/%y, %I:%M %p").date())
+with metrics.stage("aggregate"):
+    other_activity_times = to_datetime(
+        (a.time for a in activity if "New" not in a.type), "activity")
 
 
-# In[46]:
+# In[49]:
 
 
 if VERBOSE:
-    print(f"\nDays of Activity:\n")
+    print(f"\nTimes of Activity:\n")
 
-    if len(other_activity_days) > 0:
-        display(other_activity_days[0])
+    if len(other_activity_times) > 0:
+        display(other_activity_times[0])
     else:
         print("This user has no activity yet.")
 
 
-# In[47]:
-
+# In[50]:
 
-vote_days = []
 
-for v in votes:
-    vote_days.append(
-        datetime.strptime(v["time"].split(".")[0], "%Y-%m-%d %H:%M:%S").date())
+with metrics.stage("aggregate"):
+    vote_times = to_datetime((v.time for v in votes), "votes")
 
 
-# In[48]:
+# In[51]:
 
 
 if VERBOSE:
-    print(f"\nDays of vote:\n")
+    print(f"\nTimes of vote:\n")
 
-    if len(vote_days) > 0:
-        display(vote_days[0])
+    if len(vote_times) > 0:
+        display(vote_times[0])
     else:
         print("This user gave no votes yet.")
 
 
+# In[52]:
+
+
+with metrics.stage("aggregate"):
+    rollup_store = RollupStore(user_data_dir/"rollups.json")
+    update_rollups(rollup_store, pd.Series([joined_time]),
+                   related_question_times["Questions"], answer_times,
+                   other_activity_times, vote_times, votes)
+    rollup_store.save()
+
+
 # ## Questions Asked
 # 
 # Time series data of number of questions asked per day visualized as a calendar heatmap.
 
-# In[49]:
-
+# In[53]:
 
-first_question_day = min(related_question_days["Questions"])
-last_question_day = max(related_question_days["Questions"])
 
-all_question_days = pd.date_range(first_question_day,
-                                  last_question_day, freq="D")
+first_question_day = related_question_times["Questions"].min().date()
+last_question_day = related_question_times["Questions"].max().date()
 
 if VERBOSE:
     print(f"Period of questions: {first_question_day} - {last_question_day}")
 
 
-# In[50]:
-
+# In[54]:
 
-question_events = pd.Series(np.zeros(len(all_question_days)),
-                            index=all_question_days, dtype=int)
 
-for d in related_question_days["Questions"]:
-    question_events.loc[pd.DatetimeIndex([d])] += 1
+with metrics.stage("aggregate"):
+    question_events = count_daily_events(related_question_times["Questions"])
 
 if VERBOSE:
     display(question_events)
 
 
-# In[51]:
+# In[55]:
 
 
 with redirect_stderr(io.StringIO()) as f:
-    calplot.calplot(question_events, how=None, suptitle="Questions Asked",
-                    colorbar=question_events.max() > 1)
+    show_figures(calendar_figures(figure_cache, question_events,
+                                  "Questions Asked", HEADLESS_RENDERING))
 if VERBOSE:
     print(f.getvalue(), file=sys.stderr)
-plt.show()
 
 
 # ## Answers Given
 # 
 # Time series data of number of answers posted per day visualized as a calendar heatmap.
 
-# In[52]:
-
+# In[56]:
 
-first_answer_day = min(answer_days)
-last_answer_day = max(answer_days)
 
-all_answer_days = pd.date_range(first_answer_day, last_answer_day, freq="D")
+first_answer_day = answer_times.min().date()
+last_answer_day = answer_times.max().date()
 
 if VERBOSE:
     print(f"Period of answers: {first_answer_day} - {last_answer_day}")
 
 
-# In[53]:
-
+# In[57]:
 
-answer_events = pd.Series(np.zeros(len(all_answer_days)),
-                          index=all_answer_days, dtype=int)
 
-for d in answer_days:
-    answer_events.loc[pd.DatetimeIndex([d])] += 1
+with metrics.stage("aggregate"):
+    answer_events = count_daily_events(answer_times)
 
 if VERBOSE:
     display(answer_events)
 
 
-# In[54]:
+# In[58]:
 
 
-calplot.calplot(answer_events, how=None, suptitle="Answers Given",
-                colorbar=answer_events.max() > 1)
-plt.show()
+show_figures(calendar_figures(figure_cache, answer_events, "Answers Given",
+                              HEADLESS_RENDERING))
 
 
 # ## Activity
 # 
 # Time series data of number of various types of activity combined per day visualized as a calendar heatmap.
 
-# In[55]:
-
+# In[59]:
 
-all_day_entries = [
-    joined_day,
-    *related_question_days["Questions"],
-    *answer_days,
-    *other_activity_days
-]
-first_activity_day = min(all_day_entries)
-last_activity_day = max(all_day_entries)
 
-all_activity_days = pd.date_range(first_activity_day, last_activity_day, freq="D")
+all_activity_times = pd.concat([
+    pd.Series([joined_time]),
+    related_question_times["Questions"],
+    answer_times,
+    other_activity_times,
+], ignore_index=True)
+first_activity_day = all_activity_times.min().date()
+last_activity_day = all_activity_times.max().date()
 
 if VERBOSE:
     print(f"Period of activity: {first_activity_day} - {last_activity_day}")
 
 
-# In[56]:
-
+# In[60]:
 
-activity_events = pd.Series(np.zeros(len(all_activity_days)),
-                            index=all_activity_days, dtype=int)
 
-for d in all_day_entries:
-    activity_events.loc[pd.DatetimeIndex([d])] += 1
+with metrics.stage("aggregate"):
+    activity_events = count_daily_events(all_activity_times)
 
 if VERBOSE:
     display(activity_events)
 
 
-# In[57]:
+# In[61]:
 
 
-calplot.calplot(activity_events, how=None, suptitle="Activity",
-                colorbar=activity_events.max() > 1)
-plt.show()
+show_figures(calendar_figures(figure_cache, activity_events, "Activity",
+                              HEADLESS_RENDERING))
 
 
-# In[58]:
+# In[62]:
 
 
+figure_cache.wait()
+
+if HEADLESS_RENDERING:
+    with open(user_data_dir/"figures.json", "w") as f:
+        f.write(json.dumps([str(path) for path in figure_cache.paths]))
+
+    if VERBOSE:
+        print(f"Rendered {len(figure_cache.paths)} figures:",
+              *figure_cache.paths, sep="\n")
+
+
+# In[63]:
+
+
+metrics.save(user_data_dir/"metrics.json")
+
 print(f"\n ** Total Elapsed time: {datetime.utcnow() - nb_st} ** \n")
 print(f"Notebook END time: {datetime.utcnow()} UTC\n")
 
 
-# In[59]:
+# In[64]:
 
 
 get_ipython().run_cell_magic('capture', '', '%mkdir OGP_classic\n')
 
 
-# In[60]:
+# In[65]:
 
 
 get_ipython().run_cell_magic('capture', '', '%%file "OGP_classic/conf.json"\n{\n  "base_template": "classic",\n  "preprocessors": {\n    "500-metadata": {\n      "type": "nbconvert.preprocessors.ClearMetadataPreprocessor",\n      "enabled": true,\n      "clear_notebook_metadata": true,\n      "clear_cell_metadata": true\n    },\n    "900-files": {\n      "type": "nbconvert.preprocessors.ExtractOutputPreprocessor",\n      "enabled": true\n    }\n  }\n}\n')
 
 
-# In[61]:
+# In[66]:
 
 
 get_ipython().run_cell_magic('capture', '', '%%file "OGP_classic/index.html.j2"\n{%- extends \'classic/index.html.j2\' -%}\n{%- block html_head -%}\n\n{#  OGP attributes for shareability #}\n<meta property="og:url"          content="https://sentinel-1.github.io/odoo_forum_user_profile/" />\n<meta property="og:type"         content="article" />\n<meta property="og:title"        content="User Participation in the Odoo Community Forum" />\n<meta property="og:description"  content="Activity statistics visualized in a way similar to GitHub\'s contributions plot" />\n<meta property="og:image"        content="https://raw.githubusercontent.com/sentinel-1/odoo_forum_user_profile/master/images/OdooProfileScreenshot.png" />\n<meta property="og:image:alt"    content="Odoo Community Forum Profile Screenshot" />\n<meta property="og:image:type"   content="image/png" />\n<meta property="og:image:width"  content="1302" />\n<meta property="og:image:height" content="987" />\n    \n<meta property="article:published_time" content="2022-08-20T09:59:43+00:00" />\n<meta property="article:modified_time"  content="{{ resources.iso8610_datetime_utcnow }}" />\n<meta property="article:publisher"      content="https://sentinel-1.github.io" />\n<meta property="article:author"         content="https://github.com/sentinel-1" />\n<meta property="article:section"        content="datascience" />\n<meta property="article:tag"            content="datascience" />\n<meta property="article:tag"            content="Python" />\n<meta property="article:tag"            content="data" />\n<meta property="article:tag"            content="timeseries" />\n<meta property="article:tag"            content="analytics" />\n<meta property="article:tag"            content="datavisualization" />\n<meta property="article:tag"            content="bigdataunit" />\n<meta property="article:tag"            content="visualization" />\n<meta property="article:tag"            content="webscraping" />\n<meta property="article:tag"            content="odoo" />\n<meta property="article:tag"            content="forum" />\n<meta property="article:tag"            content="user" />\n\n\n<link rel="icon" type="image/x-icon" href="../favicon.ico">\n\n{{ super() }}\n\n{%- endblock html_head -%}\n    \n    \n{% block body_header %}\n<body>\n    \n<div class="container">\n  <nav class="navbar navbar-default">\n    <div class="container-fluid">\n      <ul class="nav nav-pills  navbar-left">\n        <li role="presentation">\n          <a href="/">\n            <svg xmlns="http://www.w3.org/2000/svg"\n                 viewBox="0 0 576 512" width="1em">\n              <path \n                fill="#999999"\nd="M 288,0 574,288 511,288 511,511 352,511 352,352 223,352 223,511 62,511 64,288 0,288 Z"\n              />\n            </svg> Home\n          </a>\n        </li>\n      </ul>\n      <ul class="nav nav-pills  navbar-right">\n        <li role="presentation" class="active">\n          <a href="/odoo_forum_user_profile/">🇬🇧 English </a>\n        </li>\n        <li role="presentation">\n          <a href="/odoo_forum_user_profile/ka/">🇬🇪 ქართული</a>\n        </li>\n      </ul>\n    </div>\n  </nav>\n</div>\n\n\n\n  <div tabindex="-1" id="notebook" class="border-box-sizing">\n    <div class="container" id="notebook-container">    \n{% endblock body_header %}\n\n{% block body_footer %}\n    </div>\n  </div>\n  <footer>\n    <div class="container"\n         style="display:flex; flex-direction: row; justify-content: center; align-items: center;">\n      <p style="margin: 3.7em auto;"> © 2022\n        <a href="https://github.com/sentinel-1" target="_blank">Sentinel-1</a>\n      </p>\n      <!-- TOP.GE ASYNC COUNTER CODE -->\n      <div id="top-ge-counter-container" data-site-id="116052"\n           style="margin-right: 3.7em;float: right;"></div>\n      <script async src="//counter.top.ge/counter.js"></script>\n      <!-- / END OF TOP.GE COUNTER CODE -->\n      <!-- ANALYTICS.LAGOGAL.COM -->\n      <div id="analytics-lagogal-com-access" data-site-id="20221"\n           style="margin: 0;padding: 0;"></div>\n      <script async src="//analytics.lagogal.com/access.js"></script>\n      <!-- / END OF ANALYTICS.LAGOGAL.COM -->\n     </div>\n  </footer>\n</body>\n{% endblock body_footer %}\n')
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Run the "Forum User Profile" notebook for a batch of users.
+
+Each user is processed by its own kernel (and hence its own session and
+`data/<USER_ID>` directory) in a pool of worker processes. The workers share
+one budget of requests per second through a locked file, so the whole batch
+stays within the same rate limit as a single run of the notebook. The budget
+is the ceiling of the rate which every worker adapts to the server. The
+executed notebook of each user is saved into its `data/<USER_ID>` directory.
+
+Example:
+
+    python batch.py 123 456 789 --workers 4 --requests-per-second 1
+"""
+import argparse
+import ast
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import nbformat
+from nbconvert.preprocessors import ExecutePreprocessor
+
+
+NOTEBOOK_DIR = Path(__file__).resolve().parent
+NOTEBOOK_PATH = NOTEBOOK_DIR / "Forum User Profile.ipynb"
+
+
+def inject_parameters(nb, parameters):
+    """Insert a cell setting `parameters` after the last "parameters" cell.
+
+    This follows the convention of papermill, so the notebook defaults stay
+    in the cells tagged as "parameters" and are overridden right after them.
+    """
+    parameter_cells = [i for i, cell in enumerate(nb.cells)
+                       if "parameters" in cell.metadata.get("tags", [])]
+    nb.cells.insert(parameter_cells[-1] + 1, nbformat.v4.new_code_cell(
+        "\n".join(f"{name} = {value!r}" for name, value in parameters.items()),
+        metadata={"tags": ["injected-parameters"]}))
+
+
+def run_notebook(user_id, parameters, timeout=None):
+    nb = nbformat.read(NOTEBOOK_PATH, as_version=4)
+    inject_parameters(nb, {"USER_ID": user_id, **parameters})
+    try:
+        ExecutePreprocessor(timeout=timeout).preprocess(
+            nb, {"metadata": {"path": str(NOTEBOOK_DIR)}})
+    finally:
+        user_data_dir = NOTEBOOK_DIR / "data" / str(user_id)
+        user_data_dir.mkdir(parents=True, exist_ok=True)
+        nbformat.write(nb, user_data_dir / NOTEBOOK_PATH.name)
+    return user_data_dir / NOTEBOOK_PATH.name
+
+
+def parse_parameter(text):
+    name, _, value = text.partition("=")
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("user_ids", nargs="*", metavar="USER_ID")
+    parser.add_argument("--users-file", type=Path,
+                        help="file with one user ID per line")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of users processed in parallel "
+                             "(default: number of CPUs)")
+    parser.add_argument("--requests-per-second", type=float, default=0.5,
+                        help="request budget shared by all the workers, "
+                             "the ceiling of their rate")
+    parser.add_argument("--max-concurrent-requests", type=int, default=4,
+                        help="parallel requests per worker")
+    parser.add_argument("--timeout", type=int, default=None,
+                        help="timeout of a single notebook cell in seconds")
+    parser.add_argument("-p", "--parameter", action="append", default=[],
+                        type=parse_parameter, metavar="NAME=VALUE",
+                        help="set any other parameter of the notebook, "
+                             "e.g. -p INCREMENTAL_SYNC=True")
+    args = parser.parse_args(argv)
+
+    user_ids = list(args.user_ids)
+    if args.users_file is not None:
+        user_ids += args.users_file.read_text().split()
+    if not user_ids:
+        parser.error("no user IDs given")
+
+    rate_limit_file = NOTEBOOK_DIR / "data" / ".rate_limit"
+    rate_limit_file.parent.mkdir(parents=True, exist_ok=True)
+    rate_limit_file.write_text("0")
+
+    parameters = {
+        "START_REQUESTS_PER_SECOND": args.requests_per_second,
+        "REQUESTS_PER_SECOND_RANGE": (min(0.1, args.requests_per_second),
+                                      args.requests_per_second),
+        "MAX_CONCURRENT_REQUESTS": args.max_concurrent_requests,
+        "RATE_LIMIT_FILE": str(rate_limit_file),
+        **dict(args.parameter),
+    }
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(run_notebook, user_id, parameters, args.timeout):
+                user_id
+            for user_id in user_ids
+        }
+        for future in as_completed(futures):
+            user_id = futures[future]
+            try:
+                print(f"User {user_id}: saved {future.result()}")
+            except Exception as e:
+                failed.append(user_id)
+                error = str(e).strip().splitlines() or [""]
+                print(f"User {user_id}: FAILED ({type(e).__name__}: "
+                      f"{error[-1]})", file=sys.stderr)
+
+    print(f"\nDone {len(user_ids) - len(failed)} of {len(user_ids)} users.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""Offline benchmarks of the stages, on profiles made up from the fixtures.
+
+Examples:
+
+    python benchmarks/bench.py --output baseline.json
+    python benchmarks/bench.py --baseline baseline.json
+    python benchmarks/bench.py --sizes 100 1000 --skip-plot
+
+The recorded (and anonymized) profile and question pages in `fixtures/` are
+replicated into profiles of the given numbers of answers, so the stages run
+on the markup of the forum without any request to it. Every stage is timed
+and then run once more under `tracemalloc` for its peak memory, which
+counts the Python objects only (not e.g. the memory of libxml2).
+"""
+import argparse
+import copy
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from odoo_forum_profile.collect import (
+    BASE_URL, PostRecords, ProfilePage, extract_activity,
+    extract_answer_urls, extract_badges, extract_profile,
+    extract_question_card_urls, extract_votes, index_answers,
+    list_page_urls, parse_question_page, question_page_strainer,
+    with_content_hashes, write_answers, write_related_questions,
+)
+from odoo_forum_profile.records import to_json
+from odoo_forum_profile.storage import BlobStore
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+# the synthetic user asks a question per that many answers
+ANSWERS_PER_QUESTION = 10
+FIRST_DAY = datetime(2017, 1, 1, 10, 5)
+
+
+def synthetic_day(i):
+    """Spread the events of the synthetic profile over four years."""
+    return FIRST_DAY + timedelta(days=i * 37 % 1461)
+
+
+def replicate(element, n, update):
+    """Replace the `element` with `n` copies of it, changed by `update`."""
+    copies = []
+    for i in range(n):
+        element_copy = copy.copy(element)
+        update(element_copy, i)
+        copies.append(element_copy)
+    element.replace_with(*copies)
+
+
+def set_link(card, url):
+    link = card.select_one("a")
+    link["href"] = url
+    link.string = url.rsplit("/", 1)[-1]
+
+
+def question_url(i):
+    return f"/forum/help-1/synthetic-question-{i}"
+
+
+def synthesize_profile(n_answers):
+    """HTML of a profile page with `n_answers` answers and as many votes."""
+    with open(FIXTURES_DIR/"profile.html", "r") as f:
+        soup = BeautifulSoup(f.read(), "lxml")
+    n_questions = max(1, n_answers // ANSWERS_PER_QUESTION)
+
+    for section in soup.select("#questions >*"):
+        card = section.select_one(".card")
+        if card is not None:
+            replicate(card, n_questions,
+                      lambda c, i: set_link(c, question_url(i)))
+    replicate(
+        soup.select_one("#answers .card"), n_answers,
+        lambda c, i: set_link(
+            c, f"{question_url(n_questions + i)}#answer-{n_questions + i}"))
+
+    def update_activity(card, i):
+        spans = card.select(".card-body >span")
+        spans[0].string = ["New Answer", "Edited", "Commented"][i % 3]
+        spans[1].string = synthetic_day(i).strftime("%-m/%-d/%y, %I:%M %p")
+        set_link(spans[2], question_url(n_questions + i))
+
+    def update_vote(vote, i):
+        vote.contents[0].replace_with(
+            synthetic_day(i).strftime("%Y-%m-%d %H:%M:%S.%f"))
+        vote.select_one("span")["class"] = [
+            "fa", "fa-thumbs-down" if i % 7 == 0 else "fa-thumbs-up"]
+        set_link(vote, question_url(i))
+
+    replicate(soup.select_one("#activity .card"), n_answers, update_activity)
+    replicate(soup.select_one("#votes >div >div"), n_answers, update_vote)
+    return str(soup)
+
+
+def synthesize_question_pages(page_urls):
+    """HTML of the question pages by URL, the answer IDs follow the URLs."""
+    with open(FIXTURES_DIR/"question.html", "r") as f:
+        soup = BeautifulSoup(f.read(), "lxml")
+    question_time = soup.select_one("article time")
+    answer = soup.select_one("#answer_1000")
+    answer_time = answer.select_one("time")
+
+    pages = {}
+    for i, page_url in enumerate(page_urls):
+        day = synthetic_day(i).strftime("%-d %B %Y")
+        question_time.string = answer_time.string = day
+        answer["id"] = f"answer_{page_url.rsplit('-', 1)[-1]}"
+        pages[page_url] = str(soup)
+    return pages
+
+
+def parse_profile(profile_html):
+    page = ProfilePage(BeautifulSoup(profile_html, "lxml"))
+    return {
+        "page": page,
+        "user_profile": extract_profile(page, 1, "jane.doe@example.com"),
+        "badges": extract_badges(page),
+        "question_card_urls": extract_question_card_urls(page, BASE_URL),
+        "answer_urls": extract_answer_urls(page, BASE_URL),
+    }
+
+
+def parse_question_pages(pages, answer_html_ids):
+    strainer = question_page_strainer()
+    return {
+        page_url: parse_question_page(
+            page_html, answer_html_ids.get(page_url, set()), "lxml", strainer)
+        for page_url, page_html in pages.items()
+    }
+
+
+def write_records(user_data_dir, profile, question_pages):
+    post_contents = BlobStore(user_data_dir/"contents")
+    question_pages = {
+        page_url: with_content_hashes(question_page, post_contents)
+        for page_url, question_page in question_pages.items()
+    }
+
+    post_records = PostRecords(question_pages, {}, {}, BASE_URL)
+    write_related_questions(user_data_dir/"related_questions.json",
+                            profile["question_card_urls"], post_records)
+    write_answers(user_data_dir/"answers.json", profile["answer_urls"],
+                  post_records)
+    with open(user_data_dir/"user_profile.json", "w") as f:
+        f.write(to_json(profile["user_profile"]))
+
+
+def extract_events(user_data_dir, page):
+    activity = extract_activity(page, BASE_URL)
+    votes = extract_votes(page, BASE_URL)
+    with open(user_data_dir/"activity.json", "w") as f:
+        f.write(to_json(activity))
+    with open(user_data_dir/"votes.json", "w") as f:
+        f.write(to_json(votes))
+    return len(activity) + len(votes)
+
+
+def render_figures(summary, daily_events):
+    from odoo_forum_profile.plot import FigureCache, plot_all
+
+    with tempfile.TemporaryDirectory() as figures_dir:
+        figure_cache = FigureCache(Path(figures_dir), "png")
+        return len(plot_all(figure_cache, summary, daily_events))
+
+
+def measure(stage, n_answers, items, function, *args, repeat=1):
+    """Time the best of `repeat` calls and then the peak memory of one.
+
+    The `items` processed are a number or a function of the result.
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = function(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    if callable(items):
+        items = items(result)
+    return result, {
+        "answers": n_answers,
+        "stage": stage,
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds,
+        "peak_memory": peak_memory,
+    }
+
+
+def benchmark(n_answers, work_dir, skip_plot=False, repeat=1):
+    """Results of the stages on a synthetic profile of `n_answers`."""
+    from odoo_forum_profile.aggregate import aggregate
+
+    user_data_dir = work_dir / str(n_answers)
+    user_data_dir.mkdir(parents=True, exist_ok=True)
+    profile_html = synthesize_profile(n_answers)
+    results = []
+
+    profile, result = measure(
+        "profile", n_answers, n_answers,
+        parse_profile, profile_html, repeat=repeat)
+    results.append(result)
+
+    answer_html_ids = index_answers(profile["answer_urls"], BASE_URL)
+    page_urls = list_page_urls(profile["question_card_urls"],
+                               answer_html_ids, BASE_URL)
+    pages = synthesize_question_pages(page_urls)
+
+    question_pages, result = measure(
+        "question pages", n_answers, len(pages),
+        parse_question_pages, pages, answer_html_ids, repeat=repeat)
+    results.append(result)
+
+    # the records stage moves the contents out of the pages it is given
+    _, result = measure(
+        "records", n_answers, n_answers,
+        lambda: write_records(user_data_dir, profile,
+                              copy.deepcopy(question_pages)),
+        repeat=repeat)
+    results.append(result)
+
+    _, result = measure(
+        "activity/votes", n_answers, lambda n_events: n_events,
+        extract_events, user_data_dir, profile["page"], repeat=repeat)
+    results.append(result)
+
+    (summary, daily_events), result = measure(
+        "aggregate", n_answers, n_answers,
+        aggregate, user_data_dir, repeat=repeat)
+    results.append(result)
+
+    if not skip_plot:
+        _, result = measure(
+            "plot", n_answers, lambda n_figures: n_figures,
+            render_figures, summary, daily_events, repeat=repeat)
+        results.append(result)
+    return results
+
+
+def package_versions():
+    versions = {"python": platform.python_version()}
+    for package in ["beautifulsoup4", "lxml", "pandas", "matplotlib",
+                    "calplot"]:
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def print_results(results, baseline=None):
+    baseline_results = {
+        (r["answers"], r["stage"]): r for r in (baseline or {"results": []}
+                                                )["results"]}
+    print(f"{'answers':>8} {'stage':<16} {'items':>7} {'seconds':>9} "
+          f"{'items/s':>10} {'peak MiB':>9}"
+          + (f" {'vs baseline':>12}" if baseline else ""))
+    for r in results:
+        line = (f"{r['answers']:>8} {r['stage']:<16} {r['items']:>7} "
+                f"{r['seconds']:>9.3f} {r['items_per_second']:>10.1f} "
+                f"{r['peak_memory'] / 1024**2:>9.1f}")
+        previous = baseline_results.get((r["answers"], r["stage"]))
+        if previous is not None:
+            line += f" {r['seconds'] / previous['seconds']:>11.2f}x"
+        print(line)
+
+
+def regressions(results, baseline, tolerance):
+    """The results slower than in the `baseline` by more than `tolerance`."""
+    baseline_results = {
+        (r["answers"], r["stage"]): r for r in baseline["results"]}
+    return [
+        r for r in results
+        if (r["answers"], r["stage"]) in baseline_results
+        and r["seconds"] > (1 + tolerance)
+            * baseline_results[(r["answers"], r["stage"])]["seconds"]
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n\n".join(__doc__.split("\n\n")[1:]))
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000], metavar="ANSWERS",
+                        help="numbers of answers of the synthetic profiles "
+                             "(default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="time the best of that many runs")
+    parser.add_argument("--skip-plot", action="store_true",
+                        help="do not render the figures")
+    parser.add_argument("--output", type=Path,
+                        help="save the results as JSON, e.g. as a baseline")
+    parser.add_argument("--baseline", type=Path,
+                        help="compare with the results saved before")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fail when a stage is that much slower than "
+                             "in the baseline (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if not args.skip_plot:
+        import logging
+        import matplotlib
+        matplotlib.use("Agg")
+        logging.getLogger("matplotlib.font_manager").setLevel(logging.ERROR)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_answers in args.sizes:
+            results += benchmark(n_answers, Path(work_dir), args.skip_plot,
+                                 args.repeat)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.loads(f.read())
+    print_results(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(json.dumps({"versions": package_versions(),
+                                "results": results}, indent=2))
+    if baseline is not None:
+        slower = regressions(results, baseline, args.tolerance)
+        for r in slower:
+            print(f"Regression: {r['stage']} at {r['answers']} answers",
+                  file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Check the collection via JSON-RPC against a stand-in of the forum website.
+
+Examples:
+
+    python benchmarks/jsonrpc_standin.py
+    python benchmarks/jsonrpc_standin.py --answers 1000 --failing-calls 2
+
+The stand-in serves the login form, the synthetic profile page of the
+benchmarks and the `/web/dataset/call_kw` endpoint of `forum.post` records
+on a local port, and `collect(source="jsonrpc")` runs against it. Every
+question page of the profile has its posts, except for two pages: the
+question of one is missing, and the answer of the other names another
+question as its `parent_id`. Those two pages have to end up in the
+`failures.json`, and the other posts in the JSON files as they are served,
+read by one call per 100 pages. The first `--failing-calls` calls are
+answered by "503 Service Unavailable", to be retried by the collection.
+"""
+import argparse
+import json
+import math
+import re
+import sys
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from bench import ANSWERS_PER_QUESTION, synthesize_profile, synthetic_day
+from odoo_forum_profile.collect import collect, post_time
+
+
+USER_ID = 1
+SESSION_ID = "stand-in"
+# the answers have IDs of their own, unlike on the synthetic question pages
+ANSWER_ID_OFFSET = 1000000
+
+LOGIN_FORM = """<html><body>
+<form action="/web/login" method="post">
+<input type="hidden" name="csrf_token" value="stand-in-token"/>
+</form></body></html>"""
+
+
+def answer_ids(profile_html):
+    return re.sub(r"#answer-(\d+)",
+                  lambda m: f"#answer-{int(m[1]) + ANSWER_ID_OFFSET}",
+                  profile_html)
+
+
+def synthesize_posts(n_answers):
+    """The `forum.post` records by ID, and the URLs of the broken pages."""
+    n_questions = max(1, n_answers // ANSWERS_PER_QUESTION)
+    posts = {}
+    for i in range(n_questions + n_answers):
+        posts[i] = {
+            "id": i,
+            "create_date": synthetic_day(i).strftime("%Y-%m-%d %H:%M:%S"),
+            "vote_count": i % 5,
+            "name": f"Synthetic question {i}",
+            "content": f"<p>Question {i}</p>",
+            "is_correct": False,
+            "parent_id": False,
+        }
+    for i in range(n_questions, n_questions + n_answers):
+        posts[i + ANSWER_ID_OFFSET] = {
+            "id": i + ANSWER_ID_OFFSET,
+            "create_date": synthetic_day(i + 1).strftime("%Y-%m-%d %H:%M:%S"),
+            "vote_count": i % 3 - 1,
+            "name": f"Re: Synthetic question {i}",
+            "content": f"<p>Answer {i}</p>",
+            "is_correct": i % 4 == 0,
+            "parent_id": [i, f"Synthetic question {i}"],
+        }
+
+    missing_question = n_questions + n_answers - 1
+    del posts[missing_question]
+    mismatched_answer = n_questions + n_answers - 2 + ANSWER_ID_OFFSET
+    posts[mismatched_answer]["parent_id"] = [0, "Synthetic question 0"]
+    broken_page_ids = {missing_question, mismatched_answer - ANSWER_ID_OFFSET}
+    return posts, broken_page_ids
+
+
+class StandIn(BaseHTTPRequestHandler):
+    profile_html = ""
+    posts = {}
+    calls = []  # the post IDs of every call, including the failed ones
+    failing_calls = 0  # the next calls answered by 503
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, body, content_type="text/html", headers=(), status=200):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header in headers:
+            self.send_header(*header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @property
+    def logged_in(self):
+        return f"session_id={SESSION_ID}" in self.headers.get("Cookie", "")
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == f"/profile/user/{USER_ID}" and self.logged_in:
+            self.send(self.profile_html)
+        else:
+            self.send(LOGIN_FORM)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        path = urllib.parse.urlparse(self.path).path
+        if path == "/web/login":
+            self.send(self.profile_html, headers=[
+                ("Set-Cookie", f"session_id={SESSION_ID}; Path=/")])
+        elif path == "/web/dataset/call_kw/forum.post/search_read":
+            request = json.loads(body)
+            self.calls.append(request["params"]["args"][0][0][2])
+            if self.failing_calls:
+                type(self).failing_calls -= 1
+                self.send("Service Unavailable",
+                          headers=[("Retry-After", "0")], status=503)
+            else:
+                self.send(json.dumps(self.search_read(request)),
+                          "application/json")
+        else:
+            self.send_error(404)
+
+    def search_read(self, request):
+        if not self.logged_in:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {
+                "code": 100, "message": "Odoo Session Expired"}}
+        (field, operator, ids), = request["params"]["args"][0]
+        assert (field, operator) == ("id", "in")
+        fields = ["id", *request["params"]["kwargs"]["fields"]]
+        return {"jsonrpc": "2.0", "id": request["id"], "result": [
+            {field: self.posts[post_id][field] for field in fields}
+            for post_id in ids if post_id in self.posts]}
+
+
+def check_collection(user_data_dir, posts, broken_page_ids, calls):
+    """Descriptions of the collected data differing from the stand-in."""
+    errors = []
+    with open(user_data_dir/"related_questions.json", "r") as f:
+        related_questions = json.loads(f.read())
+    with open(user_data_dir/"answers.json", "r") as f:
+        answers = json.loads(f.read())
+    with open(user_data_dir/"failures.json", "r") as f:
+        failed_ids = {int(failure["URL"].rsplit("-", 1)[-1])
+                      for failure in json.loads(f.read())}
+
+    page_ids = ({post_id for post_id in posts if post_id < ANSWER_ID_OFFSET}
+                | broken_page_ids)
+    # the calls of the first pass, as a retried call repeats the same IDs
+    batch_page_ids = [
+        [post_id for post_id in batch if post_id < ANSWER_ID_OFFSET]
+        for batch in dict.fromkeys(map(tuple, calls))
+    ][:math.ceil(len(page_ids) / 100)]
+    if (any(len(ids) > 100 for ids in batch_page_ids)
+            or sorted(post_id for ids in batch_page_ids for post_id in ids)
+            != sorted(page_ids)):
+        errors.append(f"{len(page_ids)} pages not read by 100 per call")
+    if failed_ids != broken_page_ids:
+        errors.append(f"failed pages {sorted(failed_ids)} instead of "
+                      f"{sorted(broken_page_ids)}")
+
+    for question in (q for section in related_questions.values()
+                     for q in section):
+        post = posts[int(question["URL"].rsplit("-", 1)[-1])]
+        if ((question["time"], question["votes"], question["title"])
+                != (post_time(post["create_date"]), post["vote_count"],
+                    post["name"])):
+            errors.append(f"question {question['URL']} differs")
+    for answer in answers:
+        post = posts[int(answer["URL"].rsplit("-", 1)[-1])]
+        if ((answer["time"], answer["votes"], answer["accepted"])
+                != (post_time(post["create_date"]), post["vote_count"],
+                    post["is_correct"])):
+            errors.append(f"answer {answer['URL']} differs")
+    n_answers = sum(post_id >= ANSWER_ID_OFFSET for post_id in posts)
+    if len(answers) != n_answers - len(broken_page_ids):
+        errors.append(f"{len(answers)} answers collected of {n_answers}")
+    return errors
+
+
+def run_collection(n_answers, failing_calls=0, retries=3):
+    """Collect from the stand-in, return the errors of `check_collection`."""
+    StandIn.profile_html = answer_ids(synthesize_profile(n_answers))
+    StandIn.posts, broken_page_ids = synthesize_posts(n_answers)
+    StandIn.calls = []
+    StandIn.failing_calls = failing_calls
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            user_data_dir = collect(
+                USER_ID, "jane.doe@example.com", "password", Path(data_dir),
+                base_url=base_url, source="jsonrpc",
+                start_requests_per_second=100,
+                requests_per_second_range=(100, 100), retries=retries)
+            return check_collection(user_data_dir, StandIn.posts,
+                                    broken_page_ids, StandIn.calls)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n\n".join(__doc__.split("\n\n")[1:]))
+    parser.add_argument("--answers", type=int, default=250,
+                        help="answers of the synthetic profile "
+                             "(default: %(default)s)")
+    parser.add_argument("--failing-calls", type=int, default=0,
+                        help="calls answered by 503 first "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    errors = run_collection(args.answers, args.failing_calls)
+    for error in errors:
+        print(error, file=sys.stderr)
+    print(f"{len(StandIn.calls)} calls, "
+          f"{'FAILED' if errors else 'OK'}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Convert the executed notebooks into the HTML and PDF docs.
+
+A target (the HTML page rendered with the template, the PDF with the images
+embedded) is converted only when the fingerprint of its inputs differs from
+the one saved by the previous conversion into the `.fingerprints.json` file
+of the output directory, or when the target is missing. The inputs are the
+sources and outputs of the cells, the template files and the nbconvert
+options of the HTML, and the images embedded into the PDF. All the needed
+conversions, of one or of many notebooks, run concurrently.
+
+Example:
+
+    python build_docs.py --output-dir docs --template OGP_classic
+    python build_docs.py data/*/"Forum User Profile.ipynb" --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import nbformat
+
+
+NOTEBOOK_DIR = Path(__file__).resolve().parent
+NOTEBOOK_PATH = NOTEBOOK_DIR / "Forum User Profile.ipynb"
+
+FINGERPRINTS_FILE = ".fingerprints.json"
+
+_fingerprints_lock = threading.Lock()
+
+
+def notebook_digest(path):
+    """Hash of the sources and outputs of the cells of the notebook.
+
+    The metadata, e.g. the execution timestamps, is left out so that a rerun
+    with the same outputs keeps the docs.
+    """
+    nb = nbformat.read(path, as_version=4)
+    cells = [(cell.cell_type, cell.source, cell.get("outputs", []))
+             for cell in nb.cells]
+    return hashlib.sha256(
+        json.dumps(cells, sort_keys=True).encode()).hexdigest()
+
+
+def fingerprint(digest, args, files):
+    """Hash of the notebook `digest`, the nbconvert `args` and the `files`."""
+    h = hashlib.sha256(digest.encode())
+    h.update(json.dumps(args).encode())
+    for path in sorted(files):
+        h.update(str(path).encode())
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()
+
+
+def directory_files(directory):
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return [path for path in directory.rglob("*") if path.is_file()]
+
+
+def targets(notebook, output_dir, template, config):
+    """Output file, nbconvert arguments and input files of each target."""
+    html_args = ["--to", "html", "--output", "index"]
+    html_files = []
+    if template is not None:
+        html_args += ["--template", template]
+        html_files += directory_files(template)
+    if config is not None:
+        html_args += ["--config", str(config)]
+        html_files.append(config)
+
+    return [
+        (output_dir / "index.html", html_args, html_files),
+        (output_dir / (notebook.stem + ".pdf"),
+         ["--embed-images", "--to", "pdf"],
+         directory_files(notebook.parent / "images")),
+    ]
+
+
+def load_fingerprints(output_dir):
+    try:
+        return json.loads((output_dir / FINGERPRINTS_FILE).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def save_fingerprint(output_file, value):
+    with _fingerprints_lock:
+        fingerprints = load_fingerprints(output_file.parent)
+        fingerprints[output_file.name] = value
+        (output_file.parent / FINGERPRINTS_FILE).write_text(
+            json.dumps(fingerprints, indent=2, sort_keys=True))
+
+
+def convert(notebook, output_file, args, value):
+    subprocess.run(
+        [sys.executable, "-m", "nbconvert", str(notebook), *args,
+         f"--output-dir={output_file.parent}"],
+        check=True, capture_output=True, text=True)
+    save_fingerprint(output_file, value)
+    return output_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("notebooks", nargs="*", type=Path,
+                        default=[NOTEBOOK_PATH], metavar="NOTEBOOK",
+                        help="executed notebooks (default: %(default)s)")
+    parser.add_argument("--output-dir", type=Path,
+                        help="directory of the docs (default: the directory "
+                             "of each notebook)")
+    parser.add_argument("--template",
+                        help="nbconvert template of the HTML page")
+    parser.add_argument("--config", type=Path,
+                        help="Jupyter config file of the HTML conversion")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of concurrent conversions "
+                             "(default: %(default)s)")
+    parser.add_argument("--force", action="store_true",
+                        help="convert even the unchanged targets")
+    args = parser.parse_args(argv)
+
+    conversions = []
+    for notebook in args.notebooks:
+        output_dir = args.output_dir or notebook.parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+        fingerprints = load_fingerprints(output_dir)
+        digest = notebook_digest(notebook)
+        for output_file, nbconvert_args, files in targets(
+                notebook, output_dir, args.template, args.config):
+            value = fingerprint(digest, nbconvert_args, files)
+            if (not args.force and output_file.exists()
+                    and fingerprints.get(output_file.name) == value):
+                print(f"Unchanged {output_file}")
+            else:
+                conversions.append(
+                    (notebook, output_file, nbconvert_args, value))
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(convert, *conversion): conversion
+                   for conversion in conversions}
+        for future in as_completed(futures):
+            output_file = futures[future][1]
+            try:
+                print(f"Converted {future.result()}")
+            except subprocess.CalledProcessError as e:
+                failed.append(output_file)
+                error = e.stderr.strip().splitlines() or [""]
+                print(f"{output_file}: FAILED ({error[-1]})", file=sys.stderr)
+
+    print(f"\nConverted {len(conversions) - len(failed)} of "
+          f"{len(conversions)} changed targets.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
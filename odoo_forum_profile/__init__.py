@@ -0,0 +1,12 @@
+"""Collecting and visualizing the participation of a user in the Odoo forum.
+
+The stages are split into modules, so that each of them imports only the
+libraries it needs:
+
+- `fetch`: rate limited and cached fetching of the forum pages
+- `storage`: stores of the collected records and contents
+- `collect`: logging in and collecting the data of a user profile
+- `aggregate`: turning the collected data into time series (pandas)
+- `plot`: rendering the figures (matplotlib, seaborn, calplot)
+- `cli`: the ``odoo-forum-profile`` command
+"""
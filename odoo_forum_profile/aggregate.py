@@ -0,0 +1,177 @@
+"""Turning the collected data of a user into time series of the events."""
+import json
+
+import pandas as pd
+
+from .records import Activity, Profile, Vote, load_records
+from .rollup import RollupStore
+from .storage import read_table
+
+
+TIME_FORMATS = {
+    "Joined": "%d %b %Y",
+    "posts": "%d %B %Y",
+    "activity": "%m/%d/%y, %I:%M %p",
+    "votes": "%Y-%m-%d %H:%M:%S.%f",
+}
+
+# the types of the events counted by the `rollup.RollupStore`
+EVENT_TYPES = ("Joined", "Questions", "Answers", "Other activity",
+               "Positive votes given", "Negative votes given")
+
+
+def to_datetime(times, source):
+    """The `times` collected from the `source` as a `datetime64` series."""
+    times = pd.Series(list(times), dtype=object)
+    if source == "votes":
+        # the fraction of a second is omitted when it is zero
+        times = times.where(times.str.contains(".", regex=False),
+                            times + ".0")
+    return pd.to_datetime(times, format=TIME_FORMATS[source])
+
+
+def count_daily_events(times):
+    """Number of events per day over the whole period spanned by the `times`."""
+    days = pd.DatetimeIndex(times).normalize()
+    return (days.value_counts()
+            .reindex(pd.date_range(days.min(), days.max(), freq="D"),
+                     fill_value=0)
+            .astype(int))
+
+
+def load_json(path):
+    with open(path, "r") as f:
+        return json.loads(f.read())
+
+
+def load_post_times(user_data_dir, columnar_format=None):
+    """Times of the questions by section and of the answers.
+
+    Of the columnar tables, if given, only the time columns are read.
+    """
+    if columnar_format is None:
+        return ({
+            section_name: [q["time"] for q in section_questions]
+            for section_name, section_questions in load_json(
+                user_data_dir/"related_questions.json").items()
+        }, [answer["time"] for answer in load_json(
+            user_data_dir/"answers.json")])
+
+    question_times = {
+        section_name: section_questions["time"].tolist()
+        for section_name, section_questions in read_table(
+            user_data_dir/f"questions.{columnar_format}",
+            columns=["section", "time"]
+        ).groupby("section", observed=False)
+    }
+    answer_times = read_table(user_data_dir/f"answers.{columnar_format}",
+                              columns=["time"])["time"].tolist()
+    return question_times, answer_times
+
+
+def count_summary(related_questions, answers, user_profile, votes):
+    """Numbers of the questions/answers and of the votes received/given."""
+    return pd.Series({
+        "Questions": len(related_questions["Questions"]),
+        "Answers": len(answers),
+        "Positive votes received": user_profile.positive_votes,
+        "Negative votes received": user_profile.negative_votes,
+        "Positive votes given": len([v for v in votes if v.is_positive]),
+        "Negative votes given": len([v for v in votes if not v.is_positive]),
+    })
+
+
+def update_rollups(rollup_store, joined_times, question_times, answer_times,
+                   other_activity_times, vote_times, votes):
+    """Count the new events of every type of `EVENT_TYPES` into the store."""
+    is_positive = [v.is_positive for v in votes]
+    for event_type, times in zip(EVENT_TYPES, [
+            joined_times,
+            question_times,
+            answer_times,
+            other_activity_times,
+            vote_times[is_positive],
+            vote_times[[not positive for positive in is_positive]],
+    ]):
+        rollup_store.update(event_type, times)
+
+
+def aggregate(user_data_dir, columnar_format=None, rollup_store=None):
+    """The summary counts and the daily events, by the titles of the plots.
+
+    The events are also counted into the optional `rollup.RollupStore`.
+    """
+    user_profile = load_records(user_data_dir/"user_profile.json", Profile)
+    question_post_times, answer_post_times = load_post_times(
+        user_data_dir, columnar_format)
+    activity = load_records(user_data_dir/"activity.json", Activity)
+    votes = load_records(user_data_dir/"votes.json", Vote)
+
+    question_times = to_datetime(question_post_times["Questions"], "posts")
+    answer_times = to_datetime(answer_post_times, "posts")
+    other_activity_times = to_datetime(
+        (a.time for a in activity if "New" not in a.type), "activity")
+    joined_times = to_datetime([user_profile.joined], "Joined")
+    all_activity_times = pd.concat([
+        joined_times,
+        question_times,
+        answer_times,
+        other_activity_times,
+    ], ignore_index=True)
+
+    summary = count_summary(question_post_times, answer_post_times,
+                            user_profile, votes)
+    daily_events = {
+        "Questions Asked": count_daily_events(question_times),
+        "Answers Given": count_daily_events(answer_times),
+        "Activity": count_daily_events(all_activity_times),
+    }
+
+    if rollup_store is not None:
+        update_rollups(rollup_store, joined_times, question_times,
+                       answer_times, other_activity_times,
+                       to_datetime((v.time for v in votes), "votes"),
+                       votes)
+    return summary, daily_events
+
+
+def count_rollup_events(rollup_store, *event_types):
+    """`count_daily_events` of the `event_types` counted by the store."""
+    days = pd.concat([rollup_store.counts(event_type)
+                      for event_type in event_types])
+    return count_daily_events(
+        pd.to_datetime(days.index).repeat(days.to_numpy()))
+
+
+def aggregate_rollups(user_data_dir):
+    """The same as `aggregate`, from the counts of the saved rollups."""
+    user_profile = load_records(user_data_dir/"user_profile.json", Profile)
+    rollups = RollupStore(user_data_dir/"rollups.json")
+
+    summary = pd.Series({
+        "Questions": rollups.total("Questions"),
+        "Answers": rollups.total("Answers"),
+        "Positive votes received": user_profile.positive_votes,
+        "Negative votes received": user_profile.negative_votes,
+        "Positive votes given": rollups.total("Positive votes given"),
+        "Negative votes given": rollups.total("Negative votes given"),
+    })
+    daily_events = {
+        "Questions Asked": count_rollup_events(rollups, "Questions"),
+        "Answers Given": count_rollup_events(rollups, "Answers"),
+        "Activity": count_rollup_events(rollups, "Joined", "Questions",
+                                        "Answers", "Other activity"),
+    }
+    return summary, daily_events
+
+
+def save_aggregates(path, summary, daily_events):
+    with open(path, "w") as f:
+        f.write(json.dumps({
+            "summary": {k: int(v) for k, v in summary.items()},
+            "daily_events": {
+                title: {day.date().isoformat(): int(n)
+                        for day, n in events.items() if n}
+                for title, events in daily_events.items()
+            },
+        }))
@@ -0,0 +1,225 @@
+"""The ``odoo-forum-profile`` command: collect, aggregate and plot the data.
+
+Examples:
+
+    odoo-forum-profile collect --incremental-sync
+    odoo-forum-profile aggregate
+    odoo-forum-profile plot --workers 4
+
+Every stage works on the `data/<USER_ID>` directory, the user ID and the
+credentials are taken from the `secret.json` file by default. Only the
+libraries of the requested stage are imported, so e.g. a periodic collection
+neither imports pandas nor the plotting libraries and needs no Jupyter.
+The timings and counters of every run are saved as a JSON report, see
+`metrics.Metrics.report`.
+"""
+import argparse
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from .metrics import Metrics
+
+
+def load_secret(path):
+    with open(path, "r") as f:
+        s = json.loads(f.read())
+
+    if (any([k not in s for k in ["user_id", "email", "password"]])
+        or any([not s[k] for k in s])):
+        raise Exception("Please provide your credentials first!")
+    return s
+
+
+def run_collect(args, user_id, secret, metrics):
+    from .collect import BASE_URL, collect
+
+    if args.html_parser == "lxml":
+        import importlib.util
+
+        if importlib.util.find_spec("lxml") is None:
+            args.html_parser = "html.parser"
+
+    progress = None
+    if args.verbose:
+        # the progress bars need the optional "progress" extra
+        try:
+            from tqdm import tqdm as progress
+        except ImportError:
+            pass
+
+    collect(user_id, secret["email"], secret["password"], args.data_dir,
+            base_url=args.base_url or BASE_URL,
+            incremental_sync=args.incremental_sync, resume=args.resume,
+            html_parser=args.html_parser,
+            partial_parsing=not args.full_parsing,
+            columnar_format=args.columnar_format, source=args.source,
+            max_concurrent_requests=args.max_concurrent_requests,
+            start_requests_per_second=args.start_requests_per_second,
+            requests_per_second_range=args.requests_per_second_range,
+            slow_response=args.slow_response, retries=args.retries,
+            rate_limit_file=args.rate_limit_file,
+            http_cache_max_age=timedelta(hours=args.http_cache_max_age),
+            http_cache_max_size=args.http_cache_max_size,
+            refresh_sample_size=args.refresh_sample_size,
+            database=args.database, verbose=args.verbose, progress=progress,
+            metrics=metrics)
+
+
+def run_aggregate(args, user_id, metrics):
+    from .aggregate import aggregate, save_aggregates
+    from .rollup import RollupStore
+
+    user_data_dir = args.data_dir / str(user_id)
+    rollup_store = RollupStore(user_data_dir/"rollups.json")
+    with metrics.stage("aggregate"):
+        save_aggregates(user_data_dir/"aggregates.json",
+                        *aggregate(user_data_dir, args.columnar_format,
+                                   rollup_store))
+        rollup_store.save()
+    if args.verbose:
+        print(f"Saved {user_data_dir/'aggregates.json'} and "
+              f"{rollup_store.path}")
+
+
+def run_plot(args, user_id, metrics):
+    import logging
+    import matplotlib
+    matplotlib.use("Agg")
+    # calplot asks for the Helvetica font, which is often missing
+    logging.getLogger("matplotlib.font_manager").setLevel(logging.ERROR)
+
+    from .aggregate import aggregate, aggregate_rollups
+    from .plot import FigureCache, plot_all
+
+    user_data_dir = args.data_dir / str(user_id)
+    figure_cache = FigureCache(args.data_dir / ".figure_cache",
+                               args.figure_format, headless=True,
+                               workers=args.workers, metrics=metrics,
+                               max_size=args.figure_cache_max_size)
+    with metrics.stage("aggregate"):
+        if args.from_rollups:
+            summary, daily_events = aggregate_rollups(user_data_dir)
+        else:
+            summary, daily_events = aggregate(user_data_dir,
+                                              args.columnar_format)
+    with metrics.stage("plot"):
+        paths = plot_all(figure_cache, summary, daily_events)
+        figure_cache.wait()
+
+    with open(user_data_dir/"figures.json", "w") as f:
+        f.write(json.dumps([str(path) for path in paths]))
+    if args.verbose:
+        print(f"Rendered {len(paths)} figures:", *paths, sep="\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="odoo-forum-profile", description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n\n".join(__doc__.split("\n\n")[1:]))
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("user_id", nargs="?", metavar="USER_ID",
+                        help="the \"user_id\" from the secret file by default")
+    common.add_argument("--secret", type=Path, default=Path("secret.json"),
+                        help="JSON file with the \"user_id\", \"email\" and "
+                             "\"password\" (default: %(default)s)")
+    common.add_argument("--data-dir", type=Path, default=Path("data"),
+                        help="directory of the data (default: %(default)s)")
+    common.add_argument("--columnar-format", choices=["parquet", "feather"],
+                        help="also save/read the posts as columnar tables")
+    common.add_argument("--metrics", type=Path, metavar="FILE",
+                        help="save the timings and counters of the run "
+                             "(default: <data-dir>/<USER_ID>/"
+                             "metrics_<command>.json)")
+    common.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    collect_parser = commands.add_parser(
+        "collect", parents=[common],
+        help="collect the data of the user from the forum")
+    collect_parser.add_argument("--base-url", default=None,
+                                help="URL of the Odoo website "
+                                     "(default: https://www.odoo.com)")
+    collect_parser.add_argument("--incremental-sync", action="store_true",
+                                help="fetch only the new question pages")
+    collect_parser.add_argument("--resume", action="store_true",
+                                help="continue the interrupted collection")
+    collect_parser.add_argument("--html-parser", default="lxml",
+                                choices=["lxml", "html.parser"])
+    collect_parser.add_argument("--full-parsing", action="store_true",
+                                help="parse the whole question pages")
+    collect_parser.add_argument("--source", default="html",
+                                choices=["html", "jsonrpc"],
+                                help="scrape the question pages or read the "
+                                     "posts via JSON-RPC "
+                                     "(default: %(default)s)")
+    collect_parser.add_argument("--max-concurrent-requests", type=int,
+                                default=4)
+    collect_parser.add_argument("--start-requests-per-second", type=float,
+                                default=0.5,
+                                help="starting rate, adapted within the "
+                                     "range (default: %(default)s)")
+    collect_parser.add_argument("--requests-per-second-range", type=float,
+                                nargs=2, default=(0.1, 2),
+                                metavar=("FLOOR", "CEILING"),
+                                help="bounds of the rate adapted to the "
+                                     "server (default: %(default)s)")
+    collect_parser.add_argument("--slow-response", type=float, default=2,
+                                metavar="SECONDS",
+                                help="slow the rate down on slower responses")
+    collect_parser.add_argument("--retries", type=int, default=3,
+                                help="retries of a failed request "
+                                     "(default: %(default)s)")
+    collect_parser.add_argument("--rate-limit-file", type=Path,
+                                help="share the budget with other processes")
+    collect_parser.add_argument("--http-cache-max-age", type=float,
+                                default=12, metavar="HOURS")
+    collect_parser.add_argument("--http-cache-max-size", type=int,
+                                default=1024**3, metavar="BYTES")
+    collect_parser.add_argument("--refresh-sample-size", type=int,
+                                default=20)
+    collect_parser.add_argument("--database", type=Path, metavar="FILE",
+                                help="also save the data into the SQLite "
+                                     "database shared by the users, e.g. "
+                                     "data/forum.sqlite")
+
+    commands.add_parser(
+        "aggregate", parents=[common],
+        help="save the summary and the daily events into aggregates.json "
+             "and count the new events into rollups.json")
+
+    plot_parser = commands.add_parser(
+        "plot", parents=[common], help="render the figures into files")
+    plot_parser.add_argument("--figure-format", default="png",
+                             choices=["png", "svg"])
+    plot_parser.add_argument("--from-rollups", action="store_true",
+                             help="plot the counts of rollups.json saved by "
+                                  "aggregate instead of the collected data")
+    plot_parser.add_argument("--workers", type=int, default=None,
+                             help="rendering processes "
+                                  "(default: number of CPUs)")
+    plot_parser.add_argument("--figure-cache-max-size", type=int,
+                             default=256 * 1024**2, metavar="BYTES")
+
+    args = parser.parse_args(argv)
+
+    secret = None
+    if args.command == "collect" or args.user_id is None:
+        secret = load_secret(args.secret)
+    user_id = args.user_id if args.user_id is not None else secret["user_id"]
+
+    metrics = Metrics()
+    if args.command == "collect":
+        run_collect(args, user_id, secret, metrics)
+    elif args.command == "aggregate":
+        run_aggregate(args, user_id, metrics)
+    else:
+        run_plot(args, user_id, metrics)
+
+    metrics_path = args.metrics or (
+        args.data_dir / str(user_id) / f"metrics_{args.command}.json")
+    metrics.save(metrics_path)
+    if args.verbose:
+        print(f"Saved {metrics_path}")
+    return 0
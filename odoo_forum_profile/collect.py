@@ -0,0 +1,838 @@
+"""Collecting the data of a user profile from the forum via webscraping."""
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+
+import requests
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+from .database import SQLiteStore
+from .fetch import (Fetcher, HTTPCache, RateLimiter, SharedRateLimiter,
+                    raise_on_failure)
+from .metrics import Metrics
+from .records import (Activity, Answer, AnsweredQuestion, Badge, Profile,
+                      Question, Vote, from_dict, to_dict, to_json)
+from .rpc import JSONRPCClient, RPCError
+from .storage import BlobStore, JSONLStore, write_json_list, write_post_tables
+
+
+BASE_URL = "https://www.odoo.com"
+# the fields of the posts read via JSON-RPC
+POST_FIELDS = ["create_date", "vote_count", "name", "content", "is_correct",
+               "parent_id"]
+
+
+def prepare_user_data_dir(user_data_dir, keep=False):
+    """Create the directory of the user data, emptied unless `keep`."""
+    if user_data_dir.is_dir():
+
+        if not keep:
+            for f in user_data_dir.rglob("*"):
+                try:
+                    f.unlink()
+                except IsADirectoryError:
+                    pass
+
+            for f in user_data_dir.rglob("*"):
+                f.rmdir()
+    else:
+        user_data_dir.mkdir(parents=True)
+
+
+def login_payload(email, password, user_id):
+    return {
+        'login': email,
+        'password': password,
+        'redirect': f'/profile/user/{user_id}'
+    }
+
+
+def session_path(data_dir, email):
+    return (data_dir / ".sessions"
+            / f"{hashlib.sha256(email.encode()).hexdigest()}.json")
+
+
+def is_logged_in(soup):
+    return soup.select_one('a[href^="/web/session/logout"]') is not None
+
+
+def restore_session(session, path, profile_url, parser, verbose=False):
+    """The profile page if the session saved at `path` is still logged in.
+
+    A missing or unreadable session file is no session, to log in again.
+    """
+    try:
+        cookies = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+    for cookie in cookies:
+        session.cookies.set(**cookie)
+    response = raise_on_failure(session.get(profile_url), verbose)
+    soup = BeautifulSoup(response.text, parser)
+
+    if not is_logged_in(soup):
+        session.cookies.clear()
+        return None
+    return soup
+
+
+def log_in(session, login_url, login_payload, parser, verbose=False):
+    response = raise_on_failure(session.get(login_url), verbose)
+    login_soup = BeautifulSoup(response.text, parser)
+    csrf_input = (login_soup
+                  .find("form", {"action": "/web/login", "method": "post"})
+                  .find("input", {"name": "csrf_token"})
+                 )
+    login_payload['csrf_token'] = csrf_input.get("value")
+
+    if verbose:
+        print({k:login_payload[k] for k in login_payload if k != "password"})
+
+    return raise_on_failure(session.post(login_url, data=login_payload),
+                            verbose)
+
+
+def save_session(session, path):
+    """Replace the file atomically, as other workers may be reading it."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.touch(mode=0o600)
+    tmp_path.write_text(json.dumps([
+        {"name": c.name, "value": c.value, "domain": c.domain,
+         "path": c.path, "expires": c.expires, "secure": c.secure}
+        for c in session.cookies
+    ]))
+    tmp_path.replace(path)
+
+
+def add_scheme_to_url(url):
+    return urllib.parse.urlunparse(urllib.parse.urlparse(url, scheme="https"))
+
+
+# the sections of the profile page by the ID or a class of their element
+SECTION_IDS = {
+    "profile_about_badge": "badges",
+    "questions": "questions",
+    "answers": "answers",
+    "activity": "activity",
+    "votes": "votes",
+}
+SECTION_CLASSES = {
+    "o_wprofile_header": "header",
+    "o_wprofile_sidebar": "sidebar",
+}
+
+# the selectors of the section parsers, compiled once
+SELECTORS = {name: soupsieve.compile(selector) for name, selector in {
+    "name": ".o_card_people_name",
+    "website": "i.fa-globe",
+    "location": "i.fa-map-marker",
+    "picture": ".o_wprofile_pict",
+    "rank": ".o_wprofile_sidebar_top a",
+    "rank icon": ".o_wprofile_sidebar_top img",
+    "sidebar table": "table#o_wprofile_sidebar_table",
+    "progress": "#o_wprofile_sidebar_collapse .o_wprofile_progress_circle",
+    "progress icon": (
+        "#o_wprofile_sidebar_collapse .o_wprofile_progress_circle img"),
+    "card": ".card",
+    "link": "a",
+    "question sections": ":scope >*",
+    "section title": "h5:first-child",
+    "activity type": ".card-body span:nth-child(1)",
+    "activity time": ".card-body span:nth-child(2)",
+    "activity link": ".card-body span:nth-child(3) a",
+    "vote items": ":scope >div >div",
+    "span": "span",
+}.items()}
+
+
+class ProfilePage:
+    """The sections of the profile page, found by a single walk over it.
+
+    The walk does not descend into a section, which is left to the parser
+    of the section, e.g. `extract_votes`. A missing section is None.
+    """
+
+    def __init__(self, soup):
+        self.sections = dict.fromkeys(
+            [*SECTION_IDS.values(), *SECTION_CLASSES.values(), "biography"])
+        found = set()
+        tags = [soup]
+        while tags and len(found) < len(self.sections):
+            tag = tags.pop()
+            section = self._section(tag)
+            if section is None:
+                tags.extend(child for child in reversed(tag.contents)
+                            if isinstance(child, Tag))
+            elif section not in found:
+                self.sections[section] = tag
+                found.add(section)
+
+    @staticmethod
+    def _section(tag):
+        section = SECTION_IDS.get(tag.get("id"))
+        if section is not None:
+            return section
+        for class_name in tag.get("class", ()):
+            if class_name in SECTION_CLASSES:
+                return SECTION_CLASSES[class_name]
+        if tag.name == "h5" and tag.string == "Biography":
+            return "biography"
+        return None
+
+    def __getattr__(self, name):
+        try:
+            return self.sections[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def extract_profile(page, user_id, email):
+    user_profile = {
+        "ID": user_id,
+        "Name": "",
+        "Website": "",
+        "Email": email,
+        "City": "",
+        "Country": "",
+        "Biography": "",
+    }
+    header, sidebar = page.header, page.sidebar
+
+    user_profile["Name"] = SELECTORS["name"].select_one(header).text.strip()
+
+    website = SELECTORS["website"].select_one(header)
+    user_profile["Website"] = (website.parent.text.strip()
+                               if website is not None else None)
+
+    location = SELECTORS["location"].select_one(header)
+    location_entries = (location.find_next_siblings()
+                        if location is not None else [])
+    user_profile["City"] = (location_entries[0].text.strip()
+                            if len(location_entries) > 0 else None)
+    try:
+        user_profile["Country"] = (
+            location_entries[1].find("span").text.strip())
+    except (IndexError, AttributeError):
+        user_profile["Country"] = None
+
+    biography = (page.biography.find_next_sibling()
+                 if page.biography is not None else None)
+    if biography is not None and len(biography.text.strip()) > 0:
+        user_profile["Biography"] = str(biography)
+    else:
+        user_profile["Biography"] = None
+
+    user_profile["Current rank"] = (
+        SELECTORS["rank"].select_one(sidebar).text.strip())
+
+    user_profile["Current rank icon"] = add_scheme_to_url(
+        SELECTORS["rank icon"].select_one(sidebar).get("src"))
+
+    sidebar_table = SELECTORS["sidebar table"].select_one(sidebar)
+    user_profile["Joined"] = sidebar_table.find(
+        "th", string="Joined").find_next_sibling().text.strip()
+
+    (
+        user_profile["Positive votes"],
+        user_profile["Negative votes"],
+    ) = sidebar_table.find(
+        "th", string="Votes").find_next_sibling().text.strip().split()
+
+    (
+        user_profile["Next rank"],
+        user_profile["Current xp"],
+        _,
+        user_profile["Next rank xp"],
+        _,
+    ) = SELECTORS["progress"].select_one(sidebar).text.split()
+
+    for key in ("Current xp", "Next rank xp",
+                "Positive votes", "Negative votes"):
+        user_profile[key] = int(user_profile[key].replace(",", ""))
+
+    user_profile["Next rank progress"] = (
+        user_profile["Current xp"] / user_profile["Next rank xp"] * 100
+    )
+    user_profile["Next rank icon"] = add_scheme_to_url(
+        SELECTORS["progress icon"].select_one(sidebar).get("src"))
+    user_profile["Avatar image"] = add_scheme_to_url(
+        SELECTORS["picture"].select_one(header)
+        .get("style").split("url(")[1].split(")")[0])
+
+    return from_dict(Profile, user_profile)
+
+
+def extract_badges(page):
+    if page.badges is None:
+        return []
+    return [Badge(
+        badge_url=add_scheme_to_url(badge.find("img").get("src")),
+        badge_name=badge.text.strip()
+    )
+        for badge in SELECTORS["card"].select(page.badges)]
+
+
+def extract_question_card_urls(page, base_url):
+    """URLs of the question cards per section of the profile page."""
+    if page.questions is None:
+        return {}
+    return {
+        SELECTORS["section title"].select_one(question_section)
+        .text.strip(): [
+            urllib.parse.urljoin(
+                base_url, SELECTORS["link"].select_one(q).get("href"))
+            for q in SELECTORS["card"].select(question_section)
+        ]
+        for question_section
+        in SELECTORS["question sections"].select(page.questions)
+    }
+
+
+def extract_answer_urls(page, base_url):
+    if page.answers is None:
+        return []
+    return [urllib.parse.urljoin(
+                base_url, SELECTORS["link"].select_one(a).get("href"))
+            for a in SELECTORS["card"].select(page.answers)]
+
+
+def extract_activity(page, base_url):
+    if page.activity is None:
+        return []
+    return [
+        Activity(
+            type=SELECTORS["activity type"].select_one(a).text,
+            time=SELECTORS["activity time"].select_one(a).text,
+            URL=urllib.parse.urljoin(
+                base_url,
+                SELECTORS["activity link"].select_one(a).get("href")),
+        )
+        for a in SELECTORS["card"].select(page.activity)
+    ]
+
+
+def extract_votes(page, base_url):
+    if page.votes is None:
+        return []
+    votes = []
+    for v in SELECTORS["vote items"].select(page.votes):
+        span = SELECTORS["span"].select_one(v)
+        if span is None:
+            continue
+        link = SELECTORS["link"].select_one(v)
+        votes.append(Vote(
+            time=next(v.children).strip(),
+            is_positive="fa-thumbs-up" in span.attrs["class"],
+            title=link.text.strip(),
+            URL=urllib.parse.urljoin(base_url, link.get("href"))
+        ))
+    return votes
+
+
+def question_page_url(url, base_url):
+    return urllib.parse.urldefrag(urllib.parse.urljoin(base_url, url)).url
+
+
+def answer_html_id(url):
+    return "#{}".format(urllib.parse.urlparse(url).fragment.replace("-","_"))
+
+
+class ParseError(Exception):
+    """A post is missing from its question page, e.g. a removed answer."""
+
+
+def extract_question(q_soup):
+    return {
+        "time": q_soup.select_one("article time").text.strip(),
+        "votes": int(q_soup.select_one(".vote_count").text.strip()),
+        "title": q_soup.select_one("article header").text.strip(),
+        "content": str(q_soup.select_one("article .o_wforum_post_content")),
+    }
+
+
+def extract_answer(a_soup):
+    return {
+        "time": a_soup.select_one("time").text.strip(),
+        "votes": int(a_soup.select_one(".vote_count").text.strip()),
+        "accepted": "o_wforum_answer_correct" in a_soup.attrs["class"],
+        "content": str(a_soup.select_one(".o_wforum_readable")),
+    }
+
+
+def is_post_element(name, attrs):
+    return (name == "article"
+            or attrs.get("id", "").startswith("answer_")
+            or "vote_count" in attrs.get("class", "").split())
+
+
+def question_page_strainer(partial_parsing=True):
+    return SoupStrainer(is_post_element) if partial_parsing else None
+
+
+def index_answers(answer_urls, base_url):
+    """HTML IDs of the answers per question page URL."""
+    answer_html_ids = {}
+    for a_url in answer_urls:
+        answer_html_ids.setdefault(
+            question_page_url(a_url, base_url), set()
+        ).add(answer_html_id(a_url))
+    return answer_html_ids
+
+
+def list_page_urls(question_card_urls, answer_html_ids, base_url):
+    """URLs of all the question pages referenced by the profile, in order."""
+    return list(dict.fromkeys([
+        *(question_page_url(q_url, base_url)
+          for q_urls in question_card_urls.values() for q_url in q_urls),
+        *answer_html_ids,
+    ]))
+
+
+def with_content_hash(post, post_contents):
+    """The `post` with its "content" moved into the `post_contents` store."""
+    if "content" not in post:
+        return post
+    post = dict(post)
+    post["content_hash"] = post_contents.put(post.pop("content"))
+    return post
+
+
+def with_content_hashes(question_page, post_contents):
+    """The `question_page` with the contents of its posts moved likewise."""
+    return {
+        "question": with_content_hash(question_page["question"],
+                                      post_contents),
+        "answers": {
+            a_html_id: with_content_hash(answer, post_contents)
+            for a_html_id, answer in question_page["answers"].items()
+        },
+    }
+
+
+def load_previous_records(user_data_dir, post_contents):
+    """Questions and answers (by URL) and the state of the previous sync."""
+    previous_questions = {}
+    previous_answers = {}
+    sync_state = {"refresh_offset": 0}
+
+    if (user_data_dir/"related_questions.json").is_file():
+        with open(user_data_dir/"related_questions.json", "r") as f:
+            previous_questions = {
+                q["URL"]: from_dict(Question,
+                                    with_content_hash(q, post_contents))
+                for section in json.loads(f.read()).values() for q in section
+            }
+    if (user_data_dir/"answers.json").is_file():
+        with open(user_data_dir/"answers.json", "r") as f:
+            previous_answers = {a["URL"]: from_dict(Answer, {
+                **with_content_hash(a, post_contents),
+                "answered_question": with_content_hash(
+                    a["answered_question"], post_contents),
+            }) for a in json.loads(f.read())}
+    if (user_data_dir/"sync_state.json").is_file():
+        with open(user_data_dir/"sync_state.json", "r") as f:
+            sync_state = json.loads(f.read())
+    return previous_questions, previous_answers, sync_state
+
+
+def plan_page_urls(all_page_urls, question_card_urls, answer_urls,
+                   previous_questions, previous_answers, sync_state,
+                   refresh_sample_size, base_url):
+    """The new question pages and the sample of old ones to refresh.
+
+    The offset of the rotating refresh sample is advanced in `sync_state`.
+    """
+    new_page_urls = {
+        question_page_url(url, base_url) for url in [
+            *(q_url for q_urls in question_card_urls.values()
+              for q_url in q_urls if q_url not in previous_questions),
+            *(a_url for a_url in answer_urls if a_url not in previous_answers),
+        ]
+    }
+    old_page_urls = sorted(set(all_page_urls) - new_page_urls)
+
+    refresh_offset = (sync_state["refresh_offset"] % len(old_page_urls)
+                      if old_page_urls else 0)
+    refresh_page_urls = set(
+        (old_page_urls[refresh_offset:] + old_page_urls[:refresh_offset]
+        )[:refresh_sample_size])
+    sync_state["refresh_offset"] = refresh_offset + len(refresh_page_urls)
+    return new_page_urls, refresh_page_urls
+
+
+def parse_question_page(html, wanted_answers, parser="lxml", strainer=None):
+    """The question and the `wanted_answers` (by HTML ID) of the page."""
+    q_soup = BeautifulSoup(html, parser, parse_only=strainer)
+    if q_soup.select_one("article") is None:
+        raise ParseError("The question is not on the page")
+    answers = {}
+    for a_html_id in wanted_answers:
+        a_soup = q_soup.select_one(a_html_id)
+        if a_soup is None:
+            raise ParseError(f"The answer {a_html_id} is not on the page")
+        answers[a_html_id] = extract_answer(a_soup)
+    return {"question": extract_question(q_soup), "answers": answers}
+
+
+def uncollected_page_urls(page_urls, answer_html_ids, question_pages):
+    """The `page_urls` missing from `question_pages` or some of their answers.
+
+    A page kept by an interrupted run is collected again if the profile got
+    another answer on it since then.
+    """
+    return [
+        url for url in page_urls
+        if url not in question_pages
+        or not (answer_html_ids.get(url, set())
+                <= question_pages.get(url)["answers"].keys())
+    ]
+
+
+def collect_question_pages(fetcher, page_urls, answer_html_ids,
+                           question_pages, post_contents, parser="lxml",
+                           strainer=None, metrics=None, follow_up_passes=1):
+    """Fetch, parse and append the `page_urls` to the `question_pages`.
+
+    The pages which failed to be fetched, or lack a wanted post, are fetched
+    again by up to `follow_up_passes` passes after all the others, those
+    failing still are left in `fetcher.failures`. The parse time of every
+    page is recorded in the optional `metrics`.
+    """
+    http_cache = fetcher.http_cache
+
+    for follow_up in range(follow_up_passes + 1):
+        if follow_up:
+            page_urls = [url for url in page_urls if url in fetcher.failures]
+            if not page_urls:
+                break
+            for url in page_urls:
+                del fetcher.failures[url]
+        responses = fetcher.fetch_all(
+            page_urls,
+            desc="Failed question pages" if follow_up else "Question pages")
+
+        for page_url, response in zip(page_urls, responses):
+            if response is None:
+                continue
+            wanted_answers = answer_html_ids.get(page_url, set())
+            question_page = (http_cache.load_extracted(page_url)
+                             if response.from_cache else None)
+
+            if (question_page is None
+                    or not wanted_answers <= question_page["answers"].keys()):
+                parse_start = time.perf_counter()
+                try:
+                    question_page = parse_question_page(
+                        response.text, wanted_answers, parser, strainer)
+                except ParseError as e:
+                    # failed like a page failing to be fetched
+                    fetcher.failures[page_url] = str(e)
+                    if metrics is not None:
+                        metrics.record_failure()
+                    continue
+                finally:
+                    if metrics is not None:
+                        metrics.record_parse(
+                            time.perf_counter() - parse_start)
+                http_cache.store_extracted(page_url, question_page)
+            question_pages.append({
+                "URL": page_url,
+                **with_content_hashes(question_page, post_contents),
+            })
+
+
+def page_post_id(page_url):
+    """ID of the question of the page, e.g. 123 of `.../question-title-123`."""
+    return int(urllib.parse.urlparse(page_url).path.rsplit("-", 1)[-1])
+
+
+def answer_post_id(a_html_id):
+    """ID of the answer of the HTML ID, e.g. 456 of `#answer_456`."""
+    return int(a_html_id.rsplit("_", 1)[-1])
+
+
+def post_time(create_date):
+    """The `create_date` of a post as it is shown on the question pages."""
+    day = datetime.strptime(create_date, "%Y-%m-%d %H:%M:%S")
+    return f"{day.day} {day:%B %Y}"
+
+
+def collect_question_posts(client, page_urls, answer_html_ids,
+                           question_pages, post_contents, failures,
+                           batch_size=100, follow_up_passes=1):
+    """Read the posts of the `page_urls` via JSON-RPC into `question_pages`.
+
+    This is the counterpart of `collect_question_pages` making a call per
+    `batch_size` pages instead of a request per page, but the contents are
+    those of the posts themselves, without the element wrapping them on the
+    pages. The pages whose posts could not be read are read again by up to
+    `follow_up_passes` passes after all the others, and those still failing
+    are left in `failures`.
+    """
+    for follow_up in range(follow_up_passes + 1):
+        if follow_up:
+            page_urls = [url for url in page_urls if url in failures]
+            if not page_urls:
+                break
+            for url in page_urls:
+                del failures[url]
+        for start in range(0, len(page_urls), batch_size):
+            read_question_posts(
+                client, page_urls[start:start + batch_size], answer_html_ids,
+                question_pages, post_contents, failures)
+
+
+def read_question_posts(client, batch_urls, answer_html_ids, question_pages,
+                        post_contents, failures):
+    """Read the posts of the `batch_urls` into `question_pages` by a call."""
+    try:
+        posts = client.read("forum.post", [
+            *map(page_post_id, batch_urls),
+            *(answer_post_id(a_html_id) for page_url in batch_urls
+              for a_html_id in answer_html_ids.get(page_url, ())),
+        ], POST_FIELDS)
+    except (requests.RequestException, RPCError) as e:
+        failures.update(dict.fromkeys(batch_urls, str(e)))
+        return
+
+    for page_url in batch_urls:
+        question_id = page_post_id(page_url)
+        answers = {
+            a_html_id: posts.get(answer_post_id(a_html_id))
+            for a_html_id in answer_html_ids.get(page_url, ())
+        }
+        if question_id not in posts or any(
+                answer is None
+                or (answer["parent_id"] or [None])[0] != question_id
+                for answer in answers.values()):
+            failures[page_url] = "The posts could not be read"
+            continue
+
+        question = posts[question_id]
+        question_pages.append({
+            "URL": page_url,
+            "question": with_content_hash({
+                "time": post_time(question["create_date"]),
+                "votes": question["vote_count"],
+                "title": question["name"],
+                "content": question["content"] or "",
+            }, post_contents),
+            "answers": {
+                a_html_id: with_content_hash({
+                    "time": post_time(answer["create_date"]),
+                    "votes": answer["vote_count"],
+                    "accepted": answer["is_correct"],
+                    "content": answer["content"] or "",
+                }, post_contents)
+                for a_html_id, answer in answers.items()
+            },
+        })
+
+
+class PostRecords:
+    """Records of the questions and answers, by the URLs of their cards.
+
+    The records are made up from the collected `question_pages`, or taken
+    over from the previous run for the pages not collected this time. There
+    is no record of a new post whose page failed to be collected, see
+    `__contains__`.
+    """
+
+    def __init__(self, question_pages, previous_questions, previous_answers,
+                 base_url):
+        self.question_pages = question_pages
+        self.previous_questions = previous_questions
+        self.previous_answers = previous_answers
+        self.base_url = base_url
+
+    def __contains__(self, url):
+        question_page = self.question_pages.get(
+            question_page_url(url, self.base_url))
+        if question_page is not None and (
+                not urllib.parse.urlparse(url).fragment
+                or answer_html_id(url) in question_page["answers"]):
+            return True
+        return url in self.previous_questions or url in self.previous_answers
+
+    def question(self, q_url):
+        question_page = self.question_pages.get(
+            question_page_url(q_url, self.base_url))
+
+        if question_page is None:
+            return self.previous_questions[q_url]
+        return Question(URL=q_url, **question_page["question"])
+
+    def answer(self, a_url):
+        question_page = self.question_pages.get(
+            question_page_url(a_url, self.base_url))
+
+        a_html_id = answer_html_id(a_url)
+        if question_page is None or a_html_id not in question_page["answers"]:
+            return self.previous_answers[a_url]
+        return Answer(
+            URL=a_url,
+            **question_page["answers"][a_html_id],
+            answered_question=AnsweredQuestion(**question_page["question"]),
+        )
+
+
+def write_related_questions(path, question_card_urls, post_records):
+    with open(path, "w") as f:
+        f.write("{")
+        for i, (section_name, q_urls) in enumerate(question_card_urls.items()):
+            f.write(", " if i else "")
+            f.write(f"{json.dumps(section_name)}: ")
+            write_json_list(f, (to_dict(post_records.question(q_url))
+                                for q_url in q_urls if q_url in post_records))
+        f.write("}")
+
+
+def write_answers(path, answer_urls, post_records):
+    with open(path, "w") as f:
+        write_json_list(f, (to_dict(post_records.answer(a_url))
+                            for a_url in answer_urls if a_url in post_records))
+
+
+def collect(user_id, email, password, data_dir, *, base_url=BASE_URL,
+            incremental_sync=False, resume=False, html_parser="lxml",
+            partial_parsing=True, columnar_format=None, source="html",
+            max_concurrent_requests=4, start_requests_per_second=0.5,
+            requests_per_second_range=(0.1, 2), slow_response=2, retries=3,
+            rate_limit_file=None, http_cache_max_age=timedelta(hours=12),
+            http_cache_max_size=1024**3, refresh_sample_size=20,
+            database=None, verbose=False, progress=None, metrics=None):
+    """Collect the data of the user into the `data_dir`/`user_id` directory.
+
+    This runs the same steps as the collection part of the notebook, the
+    keyword arguments correspond to its parameters. The stages, requests and
+    parsing are recorded in the `metrics`, if given. The collected data is
+    also saved into the SQLite `database` file, if given.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    user_data_dir = data_dir / str(user_id)
+    prepare_user_data_dir(user_data_dir, keep=incremental_sync or resume)
+
+    login_url = urllib.parse.urljoin(base_url, "/web/login")
+    payload = login_payload(email, password, user_id)
+    profile_url = urllib.parse.urljoin(base_url, payload["redirect"])
+
+    session = requests.Session()
+    session.mount(base_url, requests.adapters.HTTPAdapter(
+        pool_maxsize=max_concurrent_requests))
+    session.hooks["response"].append(metrics.record_response)
+
+    with metrics.stage("login"):
+        session_file = session_path(data_dir, email)
+        soup = restore_session(session, session_file, profile_url,
+                               html_parser, verbose)
+        if soup is None:
+            response = log_in(session, login_url, payload, html_parser,
+                              verbose)
+            soup = BeautifulSoup(response.text, html_parser)
+
+            if is_logged_in(soup):
+                save_session(session, session_file)
+
+    with metrics.stage("profile"):
+        page = ProfilePage(soup)
+        with open(user_data_dir/"user_profile.json", "w") as f:
+            f.write(to_json(extract_profile(page, user_id, email)))
+        with open(user_data_dir/"user_badges.json", "w") as f:
+            f.write(to_json(extract_badges(page)))
+
+    http_cache = HTTPCache(data_dir / ".http_cache", http_cache_max_age,
+                           http_cache_max_size)
+    if rate_limit_file is None:
+        rate_limiter = RateLimiter(start_requests_per_second,
+                                   requests_per_second_range, slow_response)
+    else:
+        rate_limiter = SharedRateLimiter(
+            start_requests_per_second, rate_limit_file,
+            requests_per_second_range, slow_response)
+    fetcher = Fetcher(session, http_cache, rate_limiter,
+                      max_concurrent_requests, progress, metrics, retries)
+    post_contents = BlobStore(user_data_dir/"post_contents")
+
+    question_card_urls = extract_question_card_urls(page, base_url)
+    answer_urls = extract_answer_urls(page, base_url)
+    answer_html_ids = index_answers(answer_urls, base_url)
+    all_page_urls = list_page_urls(question_card_urls, answer_html_ids,
+                                   base_url)
+
+    previous_questions, previous_answers, sync_state = {}, {}, {
+        "refresh_offset": 0}
+    if incremental_sync:
+        previous_questions, previous_answers, sync_state = (
+            load_previous_records(user_data_dir, post_contents))
+    new_page_urls, refresh_page_urls = plan_page_urls(
+        all_page_urls, question_card_urls, answer_urls, previous_questions,
+        previous_answers, sync_state, refresh_sample_size, base_url)
+
+    question_pages = JSONLStore(user_data_dir/"question_pages.jsonl",
+                                resume=resume)
+    page_urls = uncollected_page_urls(
+        [url for url in all_page_urls
+         if url in new_page_urls or url in refresh_page_urls],
+        answer_html_ids, question_pages)
+    with metrics.stage("question pages"):
+        if source == "jsonrpc":
+            collect_question_posts(
+                JSONRPCClient(session, base_url, rate_limiter, metrics,
+                              retries),
+                page_urls, answer_html_ids, question_pages, post_contents,
+                fetcher.failures)
+        else:
+            collect_question_pages(
+                fetcher, page_urls, answer_html_ids, question_pages,
+                post_contents, html_parser,
+                question_page_strainer(partial_parsing), metrics)
+    with open(user_data_dir/"failures.json", "w") as f:
+        f.write(json.dumps([{"URL": url, "error": error}
+                            for url, error in fetcher.failures.items()]))
+
+    if incremental_sync:
+        with open(user_data_dir/"sync_state.json", "w") as f:
+            f.write(json.dumps(sync_state))
+
+    post_records = PostRecords(question_pages, previous_questions,
+                               previous_answers, base_url)
+    with metrics.stage("related questions"):
+        write_related_questions(user_data_dir/"related_questions.json",
+                                question_card_urls, post_records)
+    with metrics.stage("answers"):
+        write_answers(user_data_dir/"answers.json", answer_urls,
+                      post_records)
+    if columnar_format is not None:
+        with metrics.stage("columnar tables"):
+            write_post_tables(user_data_dir, columnar_format,
+                              question_card_urls, answer_urls, post_records)
+
+    with metrics.stage("activity"):
+        with open(user_data_dir/"activity.json", "w") as f:
+            f.write(to_json(extract_activity(page, base_url)))
+    with metrics.stage("votes"):
+        with open(user_data_dir/"votes.json", "w") as f:
+            f.write(to_json(extract_votes(page, base_url)))
+
+    if database is not None:
+        with metrics.stage("database"):
+            sqlite_store = SQLiteStore(database)
+            sqlite_store.save_user_data(user_data_dir)
+            sqlite_store.close()
+
+    if verbose:
+        print(f"Collected {len(question_pages)} question pages for "
+              f"{sum(map(len, question_card_urls.values()))} question cards "
+              f"and {len(answer_urls)} answer cards into {user_data_dir}")
+    if fetcher.failures:
+        print(f"Failed to collect {len(fetcher.failures)} question pages, "
+              f"see {user_data_dir/'failures.json'}. A resumed or an "
+              "incremental collection fetches just them.")
+    return user_data_dir
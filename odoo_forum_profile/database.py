@@ -0,0 +1,218 @@
+"""The collected data of many users in one indexed SQLite database.
+
+The times are saved as ISO 8601 text, so that the time ranges are compared
+as strings through the indexes, e.g. the answers of every user in 2022:
+
+    SELECT user_id, count(*) FROM answers
+    WHERE time >= '2022-01-01' AND time < '2023-01-01' GROUP BY user_id
+"""
+import json
+import sqlite3
+from datetime import datetime
+
+from .records import (Activity, Answer, Badge, Profile, Question, Vote,
+                      from_dict, load_records, to_dict)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT,
+    joined TEXT,
+    positive_votes INTEGER,
+    negative_votes INTEGER,
+    profile TEXT  -- the whole user_profile.json
+);
+CREATE TABLE IF NOT EXISTS posts (  -- the questions
+    url TEXT PRIMARY KEY,
+    time TEXT,
+    votes INTEGER,
+    title TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_time ON posts (time);
+CREATE TABLE IF NOT EXISTS user_questions (  -- the related_questions.json
+    user_id INTEGER NOT NULL REFERENCES users,
+    section TEXT NOT NULL,
+    url TEXT NOT NULL REFERENCES posts,
+    PRIMARY KEY (user_id, section, url)
+);
+CREATE INDEX IF NOT EXISTS user_questions_url ON user_questions (url);
+CREATE TABLE IF NOT EXISTS answers (
+    url TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users,
+    question_url TEXT REFERENCES posts,
+    time TEXT,
+    votes INTEGER,
+    accepted INTEGER,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS answers_user_time ON answers (user_id, time);
+CREATE INDEX IF NOT EXISTS answers_question_url ON answers (question_url);
+CREATE INDEX IF NOT EXISTS answers_time ON answers (time);
+CREATE TABLE IF NOT EXISTS activity (
+    user_id INTEGER NOT NULL REFERENCES users,
+    type TEXT,
+    time TEXT,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS activity_user_time ON activity (user_id, time);
+CREATE INDEX IF NOT EXISTS activity_url ON activity (url);
+CREATE INDEX IF NOT EXISTS activity_time ON activity (time);
+CREATE TABLE IF NOT EXISTS votes (
+    user_id INTEGER NOT NULL REFERENCES users,
+    time TEXT,
+    is_positive INTEGER,
+    title TEXT,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS votes_user_time ON votes (user_id, time);
+CREATE INDEX IF NOT EXISTS votes_url ON votes (url);
+CREATE INDEX IF NOT EXISTS votes_time ON votes (time);
+CREATE TABLE IF NOT EXISTS badges (
+    user_id INTEGER NOT NULL REFERENCES users,
+    name TEXT,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS badges_user ON badges (user_id);
+"""
+
+UPSERT_USER = """
+INSERT INTO users (user_id, name, joined, positive_votes, negative_votes,
+                   profile)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    name = excluded.name, joined = excluded.joined,
+    positive_votes = excluded.positive_votes,
+    negative_votes = excluded.negative_votes, profile = excluded.profile
+"""
+
+UPSERT_POST = """
+INSERT INTO posts (url, time, votes, title, content_hash)
+VALUES (:URL, :time, :votes, :title, :content_hash)
+ON CONFLICT (url) DO UPDATE SET
+    time = excluded.time, votes = excluded.votes, title = excluded.title,
+    content_hash = excluded.content_hash
+"""
+
+UPSERT_ANSWER = """
+INSERT INTO answers (url, user_id, question_url, time, votes, accepted,
+                     content_hash)
+VALUES (:URL, :user_id, :question_url, :time, :votes, :accepted,
+        :content_hash)
+ON CONFLICT (url) DO UPDATE SET
+    user_id = excluded.user_id, question_url = excluded.question_url,
+    time = excluded.time, votes = excluded.votes,
+    accepted = excluded.accepted, content_hash = excluded.content_hash
+"""
+
+# the formats of the times as collected, the same as `aggregate.TIME_FORMATS`
+# without importing pandas into the collection
+TIME_FORMATS = {
+    "Joined": "%d %b %Y",
+    "posts": "%d %B %Y",
+    "activity": "%m/%d/%y, %I:%M %p",
+}
+
+
+def iso_time(time, source):
+    """The `time` collected from the `source` in the ISO 8601 format."""
+    if source == "votes":
+        return datetime.fromisoformat(time).isoformat()
+    return datetime.strptime(time, TIME_FORMATS[source]).isoformat()
+
+
+class SQLiteStore:
+    """Tables of the users, questions, answers, activity, votes and badges.
+
+    The questions and answers are upserted by their URL, so a post shared by
+    several users (e.g. a question answered by both) is stored once. The
+    activity, votes, badges and sections of the questions of a user are
+    replaced by every `save_user_data`, as they are listed in full on the
+    profile page.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def save_user_data(self, user_data_dir):
+        """Save the data collected into the JSON files of `user_data_dir`."""
+        user_profile = load_records(user_data_dir/"user_profile.json",
+                                    Profile)
+        with open(user_data_dir/"related_questions.json", "r") as f:
+            related_questions = {
+                section_name: [from_dict(Question, q)
+                               for q in section_questions]
+                for section_name, section_questions
+                in json.loads(f.read()).items()
+            }
+        answers = load_records(user_data_dir/"answers.json", Answer)
+        user_id = int(user_profile.id)
+
+        with self.connection:
+            self.connection.execute(UPSERT_USER, (
+                user_id, user_profile.name,
+                iso_time(user_profile.joined, "Joined"),
+                user_profile.positive_votes, user_profile.negative_votes,
+                json.dumps(to_dict(user_profile))))
+            for table in ("user_questions", "activity", "votes", "badges"):
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+            self.connection.executemany(UPSERT_POST, [
+                self._post(q) for section in related_questions.values()
+                for q in section
+            ])
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO user_questions VALUES (?, ?, ?)", [
+                    (user_id, section_name, q.URL)
+                    for section_name, section in related_questions.items()
+                    for q in section
+                ])
+
+            self.connection.executemany(UPSERT_POST, [
+                self._post(Question(a.URL.split("#")[0],
+                                    *a.answered_question))
+                for a in answers
+            ])
+            self.connection.executemany(UPSERT_ANSWER, [{
+                **self._post(a),
+                "user_id": user_id,
+                "question_url": a.URL.split("#")[0],
+                "accepted": a.accepted,
+            } for a in answers])
+
+            self.connection.executemany(
+                "INSERT INTO activity VALUES (?, ?, ?, ?)", [
+                    (user_id, a.type, iso_time(a.time, "activity"), a.URL)
+                    for a in load_records(user_data_dir/"activity.json",
+                                          Activity)
+                ])
+            self.connection.executemany(
+                "INSERT INTO votes VALUES (?, ?, ?, ?, ?)", [
+                    (user_id, iso_time(v.time, "votes"), v.is_positive,
+                     v.title, v.URL)
+                    for v in load_records(user_data_dir/"votes.json", Vote)
+                ])
+            self.connection.executemany(
+                "INSERT INTO badges VALUES (?, ?, ?)", [
+                    (user_id, b.badge_name, b.badge_url)
+                    for b in load_records(user_data_dir/"user_badges.json",
+                                          Badge)
+                ])
+
+    @staticmethod
+    def _post(post):
+        return {
+            "URL": post.URL,
+            "time": iso_time(post.time, "posts"),
+            "votes": post.votes,
+            "title": getattr(post, "title", None),  # none of an answer
+            "content_hash": post.content_hash,
+        }
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,400 @@
+"""Fetching the forum pages within a budget of requests, through a cache."""
+import email.utils
+import fcntl
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import requests
+
+
+# the server errors worth another try
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def raise_on_failure(response, verbose=False):
+    status_msg = f"HTTP response status code: {response.status_code}"
+
+    if not response.ok:
+        raise requests.HTTPError(status_msg, response=response)
+    elif verbose:
+        print(status_msg)
+    return response
+
+
+def retry_after(response):
+    """Seconds to wait as asked by the `Retry-After` header, if there is one."""
+    value = response.headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        until = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (until - datetime.now(timezone.utc)).total_seconds())
+
+
+def send_with_retries(send, rate_limiter=None, retries=3, backoff=1,
+                      metrics=None):
+    """The response of `send()`, retried on the transient failures.
+
+    The connection errors and the `TRANSIENT_STATUS_CODES` are retried up to
+    `retries` times, after a jittered exponential backoff starting at
+    `backoff` seconds, or after the `Retry-After` of the response if it is
+    longer. Every attempt waits for its slot of the optional `rate_limiter`.
+    """
+    for attempt in range(retries + 1):
+        pause = None
+        if rate_limiter is not None:
+            slept = rate_limiter.wait()
+            if metrics is not None:
+                metrics.record_sleep(slept)
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if rate_limiter is not None:
+                # a Retry-After of the response postpones the next slot
+                rate_limiter.feedback(response)
+            else:
+                pause = retry_after(response)
+            if (response.status_code not in TRANSIENT_STATUS_CODES
+                    or attempt == retries):
+                return response
+
+        if metrics is not None:
+            metrics.record_retry()
+        time.sleep(max(backoff * 2**attempt * random.uniform(0.5, 1),
+                       pause or 0))
+
+
+class HTTPCache:
+    """Response bodies stored on disk along with their validators.
+
+    The directory may be shared by the threads and by the processes of a
+    batch: the files are replaced atomically, a missing or unreadable file
+    is a miss, and the total size is kept in the `.size` file under a lock.
+    """
+
+    def __init__(self, directory, max_age, max_size):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._locked_size() as size:
+            size[0] = self._disk_size()
+
+    def _path(self, url, suffix):
+        return self.directory / (
+            hashlib.sha256(url.encode()).hexdigest() + suffix)
+
+    def _disk_size(self):
+        size = 0
+        for path in self.directory.iterdir():
+            # the ".extracted.json" files included
+            if path.suffix in (".body", ".json"):
+                try:
+                    size += path.stat().st_size
+                except FileNotFoundError:
+                    pass
+        return size
+
+    @contextmanager
+    def _locked_size(self):
+        """The total size as a list of one item, to update while locked."""
+        with self._lock, open(self.directory / ".size", "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            value = f.read()
+            size = [int(value) if value.strip() else self._disk_size()]
+            yield size
+            f.seek(0)
+            f.truncate()
+            f.write(str(size[0]))
+
+    @staticmethod
+    def _write(path, data):
+        """Replace the file with the `data`, return the change of the size."""
+        tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        try:
+            old_size = path.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        tmp_path.replace(path)
+        return len(data) - old_size
+
+    @staticmethod
+    def _remove(path):
+        """Remove the file if it is still there, return its size."""
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def lookup(self, url):
+        try:
+            meta = json.loads(self._path(url, ".json").read_text())
+            content = self._path(url, ".body").read_bytes()
+        except (FileNotFoundError, ValueError):
+            return None
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response.headers.update(meta["headers"])
+        response.encoding = meta["encoding"]
+        response._content = content
+        response.from_cache = True
+        response.cached_at = datetime.utcfromtimestamp(meta["cached_at"])
+        return response
+
+    def is_fresh(self, response):
+        return datetime.utcnow() - response.cached_at < self.max_age
+
+    def conditional_headers(self, response):
+        headers = {}
+        if response is not None:
+            if "ETag" in response.headers:
+                headers["If-None-Match"] = response.headers["ETag"]
+            if "Last-Modified" in response.headers:
+                headers["If-Modified-Since"] = response.headers["Last-Modified"]
+        return headers
+
+    def revalidated(self, response):
+        meta_file = self._path(response.url, ".json")
+        with self._locked_size() as size:
+            try:
+                meta = json.loads(meta_file.read_text())
+                # the LRU order of the eviction
+                os.utime(self._path(response.url, ".body"))
+            except (FileNotFoundError, ValueError):
+                return response  # evicted meanwhile
+            meta["cached_at"] = time.time()
+            size[0] += self._write(meta_file, json.dumps(meta).encode())
+        return response
+
+    def store(self, url, response):
+        response.from_cache = False
+        if not ("ETag" in response.headers
+                or "Last-Modified" in response.headers or self.max_age):
+            return response
+        meta = json.dumps({
+            "headers": {k: response.headers[k] for k in (
+                "Content-Type", "ETag", "Last-Modified") if k in response.headers},
+            "encoding": response.encoding,
+            "cached_at": time.time(),
+        })
+        with self._locked_size() as size:
+            size[0] -= self._remove(self._path(url, ".extracted.json"))
+            size[0] += self._write(self._path(url, ".body"), response.content)
+            size[0] += self._write(self._path(url, ".json"), meta.encode())
+            size[0] = self._evict(size[0])
+        return response
+
+    def load_extracted(self, url):
+        try:
+            return json.loads(self._path(url, ".extracted.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store_extracted(self, url, data):
+        data = json.dumps(data).encode()
+        with self._locked_size() as size:
+            if not self._path(url, ".body").is_file():
+                return  # evicted meanwhile
+            size[0] += self._write(self._path(url, ".extracted.json"), data)
+            size[0] = self._evict(size[0])
+
+    def _evict(self, size):
+        """Remove the least recently used entries above the `max_size`."""
+        if size <= self.max_size:
+            return size
+        bodies = []
+        for body in self.directory.glob("*.body"):
+            try:
+                bodies.append((body.stat().st_mtime, body))
+            except FileNotFoundError:
+                pass
+        for _, body in sorted(bodies):
+            for suffix in (".body", ".json", ".extracted.json"):
+                size -= self._remove(body.with_suffix(suffix))
+            if size <= self.max_size:
+                break
+        return size
+
+
+class RateLimiter:
+    """Hands out evenly spaced time slots to all the threads sharing it.
+
+    The rate adapts to the `feedback` of the server within the floor and
+    the ceiling of `requests_per_second_range` (fixed by default). It grows
+    while the responses are fast and successful, and it is halved on the
+    responses slower than `slow_response` seconds and on the 429 and 503
+    status codes, which also pause the requests for their `Retry-After`.
+
+    `wait` returns the number of seconds slept until the slot.
+    """
+
+    def __init__(self, requests_per_second, requests_per_second_range=None,
+                 slow_response=2):
+        self.min_requests_per_second, self.max_requests_per_second = (
+            requests_per_second_range
+            or (requests_per_second, requests_per_second))
+        self.requests_per_second = min(
+            max(requests_per_second, self.min_requests_per_second),
+            self.max_requests_per_second)
+        self.slow_response = slow_response
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    @property
+    def interval(self):
+        return 1 / self.requests_per_second
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(slot - now)
+        return slot - now
+
+    def postpone(self, seconds):
+        """Hand out no slot for the next `seconds`."""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    def feedback(self, response):
+        """Adapt the rate to the `response` received over the network."""
+        if response.status_code in (429, 503):
+            pause = retry_after(response)
+            if pause is not None:
+                self.postpone(pause)
+            self._adapt(self.requests_per_second / 2)
+        elif response.elapsed.total_seconds() > self.slow_response:
+            self._adapt(self.requests_per_second / 2)
+        elif response.ok:
+            # from the floor to the ceiling within 20 good responses
+            self._adapt(self.requests_per_second + (
+                self.max_requests_per_second
+                - self.min_requests_per_second) / 20)
+
+    def _adapt(self, requests_per_second):
+        with self._lock:
+            self.requests_per_second = min(
+                max(requests_per_second, self.min_requests_per_second),
+                self.max_requests_per_second)
+
+
+class SharedRateLimiter(RateLimiter):
+    """Keeps the next time slot in a locked file shared by the processes.
+
+    Each process adapts its own rate, but a pause asked by the server holds
+    all of them.
+    """
+
+    def __init__(self, requests_per_second, path,
+                 requests_per_second_range=None, slow_response=2):
+        super().__init__(requests_per_second, requests_per_second_range,
+                         slow_response)
+        self.path = path
+
+    def wait(self):
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            now = time.time()
+            slot = max(now, float(f.read() or 0))
+            f.seek(0)
+            f.truncate()
+            f.write(str(slot + self.interval))
+        time.sleep(slot - now)
+        return slot - now
+
+    def postpone(self, seconds):
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            next_slot = max(time.time() + seconds, float(f.read() or 0))
+            f.seek(0)
+            f.truncate()
+            f.write(str(next_slot))
+
+
+class Fetcher:
+    """Fetches pages concurrently through the cache and the rate limiter.
+
+    The requests are retried up to `retries` times starting at `backoff`
+    seconds, see `send_with_retries`. `progress` is an optional `tqdm`-like
+    wrapper of the iterable of the fetched responses, e.g. `tqdm.auto.tqdm`
+    in a notebook.
+    The optional `metrics.Metrics` count the cached responses, the retries
+    and the rate limiting.
+    """
+
+    def __init__(self, session, http_cache, rate_limiter,
+                 max_concurrent_requests, progress=None, metrics=None,
+                 retries=3, backoff=1):
+        self.session = session
+        self.http_cache = http_cache
+        self.rate_limiter = rate_limiter
+        self.max_concurrent_requests = max_concurrent_requests
+        self.progress = progress
+        self.metrics = metrics
+        self.retries = retries
+        self.backoff = backoff
+        self.failures = {}  # URL -> error, see `fetch_all`
+
+    def fetch(self, url):
+        cached = self.http_cache.lookup(url)
+        if cached is not None and self.http_cache.is_fresh(cached):
+            if self.metrics is not None:
+                self.metrics.record_cached_response()
+            return cached
+
+        response = self._get(url, self.http_cache.conditional_headers(cached))
+        if response.status_code == 304 and cached is not None:
+            return self.http_cache.revalidated(cached)
+        return self.http_cache.store(url, raise_on_failure(response))
+
+    def _get(self, url, headers):
+        return send_with_retries(
+            lambda: self.session.get(url, headers=headers), self.rate_limiter,
+            self.retries, self.backoff, self.metrics)
+
+    def _fetch_or_fail(self, url):
+        try:
+            return self.fetch(url)
+        # an OSError of the cache fails the one page too
+        except (requests.RequestException, OSError) as e:
+            self.failures[url] = str(e)
+            if self.metrics is not None:
+                self.metrics.record_failure()
+            return None
+
+    def fetch_all(self, urls, desc):
+        """Yield responses for the `urls` in order, fetching them concurrently.
+
+        A URL failing even after the retries yields None instead of stopping
+        the others, and its error is kept in `failures`.
+        """
+        with ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests) as executor:
+            responses = executor.map(self._fetch_or_fail, urls)
+            if self.progress is not None:
+                responses = self.progress(responses, desc=desc,
+                                          total=len(urls), dynamic_ncols=True,
+                                          miniters=1)
+            yield from responses
@@ -0,0 +1,145 @@
+"""Timings and counters of a run, exported as a JSON report."""
+import bisect
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# upper bounds of the buckets of the histograms, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PARSE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+class Histogram:
+    """Counts of the observed values by the upper bounds of the buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        return {
+            "count": sum(self.counts),
+            "sum": self.total,
+            "max": self.max,
+            "buckets": {
+                **{f"<={bound}": n
+                   for bound, n in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+def peak_rss():
+    """Peak resident set sizes (in bytes) of the process and its children."""
+    # `ru_maxrss` is in bytes on macOS, in kilobytes on Linux
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children": (resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                     * unit),
+    }
+
+
+class Metrics:
+    """Time spent in the stages of a run, and the requests and parsing.
+
+    The methods may be called from the threads of the `fetch.Fetcher`.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self.status_codes = {}
+        self.bytes_downloaded = 0
+        self.cached_responses = 0
+        self.retries = 0
+        self.failures = 0
+        self.parse_time = Histogram(PARSE_BUCKETS)
+        self.rate_limit_sleep = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Add the time spent in the `with` block to the stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+
+    def record_response(self, response, *args, **kwargs):
+        """Count a response received over the network.
+
+        The signature is that of a response hook of `requests`, e.g.
+        `session.hooks["response"].append(metrics.record_response)`.
+        """
+        with self._lock:
+            self.request_latency.observe(response.elapsed.total_seconds())
+            self.status_codes[response.status_code] = (
+                self.status_codes.get(response.status_code, 0) + 1)
+            self.bytes_downloaded += len(response.content)
+
+    def record_cached_response(self):
+        with self._lock:
+            self.cached_responses += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def record_parse(self, seconds):
+        with self._lock:
+            self.parse_time.observe(seconds)
+
+    def record_sleep(self, seconds):
+        with self._lock:
+            self.rate_limit_sleep += seconds
+
+    def report(self):
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "elapsed": time.perf_counter() - self._start,
+                "stages": {name: dict(stage)
+                           for name, stage in self.stages.items()},
+                "requests": {
+                    "latency": self.request_latency.to_dict(),
+                    "status_codes": {str(code): n for code, n
+                                     in sorted(self.status_codes.items())},
+                    "bytes_downloaded": self.bytes_downloaded,
+                    "cached_responses": self.cached_responses,
+                    "retries": self.retries,
+                    "failures": self.failures,
+                    "rate_limit_sleep": self.rate_limit_sleep,
+                },
+                "parse_time_per_page": self.parse_time.to_dict(),
+                "peak_rss": peak_rss(),
+            }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(json.dumps(self.report(), indent=2))
@@ -0,0 +1,210 @@
+"""Rendering the figures of the user participation, cached by their data."""
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import calplot
+import matplotlib
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+
+
+# a library upgrade may change the look of the figures of the same data
+LIBRARY_VERSIONS = (matplotlib.__version__, sns.__version__,
+                    calplot.__version__)
+# the rc parameters which do not change the rendered files
+IGNORED_RC_PARAMS = {"backend", "backend_fallback", "interactive"}
+
+
+def render_figure(path, file_format, plot, data, options):
+    """Draw `plot(data, **options)` into the file at the `path`.
+
+    Returns the number of seconds it took.
+    """
+    start = time.perf_counter()
+    plot(data, **options)
+    fig = plt.gcf()
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    fig.savefig(tmp_path, format=file_format, bbox_inches="tight")
+    plt.close(fig)
+    tmp_path.replace(path)
+    return time.perf_counter() - start
+
+
+class FigureCache:
+    """Rendered figures stored on disk under the hash of their inputs.
+
+    The inputs are the plotting function, its data and options, the current
+    rc parameters (e.g. of the seaborn theme) and the versions of the
+    plotting libraries. The figures used the longest time ago, other than
+    those of this run, are evicted by `wait` once the directory grows beyond
+    `max_size` bytes.
+
+    In the headless mode the figures are rendered in the background by a pool
+    of worker processes using the Agg backend. The rendering time of every
+    figure is recorded in the optional `metrics.Metrics`.
+    """
+
+    def __init__(self, directory, file_format, headless=False, workers=None,
+                 metrics=None, max_size=256 * 1024**2):
+        self.directory = directory
+        self.file_format = file_format
+        self.max_size = max_size
+        self.headless = headless
+        self.workers = workers
+        self.metrics = metrics
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._executor = None
+        self._futures = {}
+        self.paths = []
+
+    def _path(self, plot, data, options):
+        fingerprint = hashlib.sha256()
+        fingerprint.update(pd.util.hash_pandas_object(data).values.tobytes())
+        fingerprint.update(repr((
+            plot.__module__, plot.__qualname__, data.name,
+            sorted(options.items()), LIBRARY_VERSIONS,
+            sorted((key, value) for key, value in plt.rcParams.items()
+                   if key not in IGNORED_RC_PARAMS),
+        )).encode())
+        return self.directory / f"{fingerprint.hexdigest()}.{self.file_format}"
+
+    def _record(self, plot, data, options, seconds):
+        if self.metrics is not None:
+            label = options.get("suptitle") or data.name or plot.__name__
+            self.metrics.record_stage(f"plot: {label}", seconds)
+
+    def figure(self, plot, data, **options):
+        """The file of the figure drawn by `plot(data, **options)`.
+
+        In the headless mode the file may still be being rendered, see `wait`.
+        """
+        path = self._path(plot, data, options)
+        self.paths.append(path)
+        if path in self._futures:
+            return path
+        try:
+            os.utime(path)  # the order of the eviction
+            return path
+        except FileNotFoundError:
+            pass
+        if not self.headless:
+            self._record(plot, data, options, render_figure(
+                path, self.file_format, plot, data, options))
+            return path
+        if self._executor is None:
+            # forked workers inherit the plotting functions and style
+            self._executor = ProcessPoolExecutor(
+                self.workers, multiprocessing.get_context("fork"),
+                initializer=plt.switch_backend, initargs=("Agg",))
+        self._futures[path] = (plot, data, options, self._executor.submit(
+            render_figure, path, self.file_format, plot, data, options))
+        return path
+
+    def wait(self):
+        """Wait until all the figures rendered in the background are saved.
+
+        Then evict the figures above the `max_size`.
+        """
+        for plot, data, options, future in self._futures.values():
+            self._record(plot, data, options, future.result())
+        self._futures.clear()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._evict()
+
+    def _evict(self):
+        figures = []
+        for path in self.directory.iterdir():
+            if path.suffix == ".tmp":
+                continue  # being rendered
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            figures.append((stat.st_mtime, stat.st_size, path))
+        size = sum(figure_size for _, figure_size, _ in figures)
+        used = set(self.paths)
+        for _, figure_size, path in sorted(figures):
+            if size <= self.max_size:
+                break
+            if path not in used:
+                path.unlink(missing_ok=True)
+                size -= figure_size
+
+
+def plot_summary(counts):
+    fig, ax = plt.subplots(ncols=3, figsize=(6*3,9))
+
+    n_questions_asked = counts["Questions"]
+    n_questions_answered = counts["Answers"]
+    ax[0].set_title(
+        f"Questions & Answers ({n_questions_asked + n_questions_answered})",
+        fontsize="x-large")
+    ax[0].pie([n_questions_asked, n_questions_answered], radius=0.85,
+              colors=sns.color_palette('bright')[0:2], autopct='%.0f%%')
+    ax[0].legend(labels=[
+        f"Questions ({n_questions_asked})",
+        f"Answers ({n_questions_answered})",
+    ], fontsize="medium", loc="upper right")
+
+    n_positive_votes_received = counts["Positive votes received"]
+    n_negative_votes_received = counts["Negative votes received"]
+    ax[1].set_title(
+        "Votes Received "
+        f"({n_positive_votes_received + n_negative_votes_received})",
+        fontsize="x-large")
+    ax[1].pie([n_positive_votes_received, n_negative_votes_received],
+              radius=0.85, colors=sns.color_palette('bright')[2:4],
+              autopct='%.0f%%')
+    ax[1].legend(labels=[
+        f"Positive ({n_positive_votes_received})",
+        f"Negative ({n_negative_votes_received})",
+    ], fontsize="medium", loc="upper right")
+
+    n_positive_votes_given = counts["Positive votes given"]
+    n_negative_votes_given = counts["Negative votes given"]
+    ax[2].set_title(
+        f"Votes Given ({n_positive_votes_given + n_negative_votes_given})",
+        fontsize="x-large")
+    ax[2].pie([n_positive_votes_given, n_negative_votes_given], radius=0.85,
+              colors=sns.color_palette('bright')[2:4], autopct='%.0f%%')
+    ax[2].legend(labels=[
+        f"Positive ({n_positive_votes_given})",
+        f"Negative ({n_negative_votes_given})"
+    ], fontsize="medium", loc="upper right")
+
+
+def calendar_figures(figure_cache, events, suptitle, split_years=False):
+    """Files of the calendar heatmap of the daily `events`.
+
+    With `split_years` each year of the heatmap is a separate figure.
+    """
+    options = {"how": None, "colorbar": bool(events.max() > 1)}
+    years = events.index.year
+
+    if not split_years or years.nunique() == 1:
+        return [figure_cache.figure(calplot.calplot, events,
+                                    suptitle=suptitle, **options)]
+    # keep the colors and the zero days of the whole heatmap in every year
+    dropzero = bool((events == 0).sum() > 0.5 * events.count())
+    scale = events[events != 0] if dropzero else events
+    return [
+        figure_cache.figure(calplot.calplot, year_events, suptitle=suptitle,
+                            dropzero=dropzero, vmin=int(scale.min()),
+                            vmax=int(scale.max()), **options)
+        for year, year_events in events.groupby(years)
+    ]
+
+
+def plot_all(figure_cache, summary, daily_events, split_years=True):
+    """Files of all the figures, see `aggregate.aggregate` for the data."""
+    sns.set_theme()
+    paths = [figure_cache.figure(plot_summary, summary)]
+    for title, events in daily_events.items():
+        paths += calendar_figures(figure_cache, events, title, split_years)
+    return paths
@@ -0,0 +1,126 @@
+"""Typed records of the collected entities, in the layout of the JSON files.
+
+The records are named tuples, which take much less memory than the dicts of
+the same fields, and their fields are checked when accessed. `to_json` and
+`from_json` convert them to and from the JSON files of the `data/<USER_ID>`
+directory.
+"""
+import functools
+import json
+from typing import NamedTuple, Optional
+
+
+class Profile(NamedTuple):
+    id: str
+    name: str
+    website: Optional[str]
+    email: str
+    city: Optional[str]
+    country: Optional[str]
+    biography: Optional[str]  # HTML
+    current_rank: str
+    current_rank_icon: str
+    joined: str
+    positive_votes: int
+    negative_votes: int
+    next_rank: str
+    current_xp: int
+    next_rank_xp: int
+    next_rank_progress: float
+    next_rank_icon: str
+    avatar_image: str
+
+    # the keys of the fields in the user_profile.json
+    JSON_KEYS = ("ID", "Name", "Website", "Email", "City", "Country",
+                 "Biography", "Current rank", "Current rank icon", "Joined",
+                 "Positive votes", "Negative votes", "Next rank",
+                 "Current xp", "Next rank xp", "Next rank progress",
+                 "Next rank icon", "Avatar image")
+
+
+class Badge(NamedTuple):
+    badge_url: str
+    badge_name: str
+
+
+class Question(NamedTuple):
+    URL: str
+    time: str
+    votes: int
+    title: str
+    content_hash: str
+
+
+class AnsweredQuestion(NamedTuple):
+    time: str
+    votes: int
+    title: str
+    content_hash: str
+
+
+class Answer(NamedTuple):
+    URL: str
+    time: str
+    votes: int
+    accepted: bool
+    content_hash: str
+    answered_question: AnsweredQuestion
+
+
+class Activity(NamedTuple):
+    type: str
+    time: str
+    URL: str
+
+
+class Vote(NamedTuple):
+    time: str
+    is_positive: bool
+    title: str
+    URL: str
+
+
+@functools.lru_cache(maxsize=None)
+def _layout(record_type):
+    """JSON keys of the fields, and the record types of the nested ones."""
+    return (
+        getattr(record_type, "JSON_KEYS", record_type._fields),
+        [field_type if hasattr(field_type, "_fields") else None
+         for field_type in record_type.__annotations__.values()],
+    )
+
+
+def to_dict(record):
+    keys, nested_types = _layout(type(record))
+    return {
+        key: value if nested_type is None else to_dict(value)
+        for key, value, nested_type in zip(keys, record, nested_types)
+    }
+
+
+def from_dict(record_type, data):
+    keys, nested_types = _layout(record_type)
+    return record_type(*[
+        data[key] if nested_type is None else from_dict(nested_type, data[key])
+        for key, nested_type in zip(keys, nested_types)
+    ])
+
+
+def to_json(records):
+    """A record or a list of records as the text of their JSON file."""
+    if isinstance(records, list):
+        return json.dumps([to_dict(record) for record in records])
+    return json.dumps(to_dict(records))
+
+
+def from_json(record_type, text):
+    """A record or a list of records of the `record_type` from JSON text."""
+    data = json.loads(text)
+    if isinstance(data, list):
+        return [from_dict(record_type, item) for item in data]
+    return from_dict(record_type, data)
+
+
+def load_records(path, record_type):
+    with open(path, "r") as f:
+        return from_json(record_type, f.read())
@@ -0,0 +1,77 @@
+"""Counts of the events of a user per day, ISO week and month."""
+import json
+from datetime import date
+
+import pandas as pd
+
+
+# the keys of the periods of each granularity
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",
+    "month": "%Y-%m",
+}
+
+
+class RollupStore:
+    """Counts of the events by type and period, kept in a small JSON file.
+
+    `update` counts only the events since the day of the latest event it
+    counted before, so it may be given all the times of an event type at
+    every run. The day of that latest event is counted again, in full. A
+    store counting the events removed since then is rebuilt by deleting its
+    file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                self.rollups = json.loads(f.read())
+        except FileNotFoundError:
+            self.rollups = {}
+
+    def update(self, event_type, times):
+        times = pd.DatetimeIndex(times)
+        rollup = self.rollups.setdefault(event_type, {
+            "latest": None, **{granularity: {}
+                               for granularity in PERIOD_FORMATS}})
+        since = None
+        if rollup["latest"] is not None:
+            since = pd.Timestamp(rollup["latest"]).normalize()
+            times = times[times >= since]
+        # no event since the day of the latest one, keep the counts as they are
+        if times.empty:
+            return
+
+        if since is not None:
+            since = since.date().isoformat()
+            rollup["day"] = {day: n for day, n in rollup["day"].items()
+                             if day < since}
+        for day, n in times.normalize().value_counts().items():
+            rollup["day"][day.date().isoformat()] = int(n)
+        rollup["day"] = dict(sorted(rollup["day"].items()))
+        for granularity, period_format in PERIOD_FORMATS.items():
+            if granularity == "day":
+                continue
+            counts = {}
+            for day, n in rollup["day"].items():
+                period = date.fromisoformat(day).strftime(period_format)
+                counts[period] = counts.get(period, 0) + n
+            rollup[granularity] = counts
+        rollup["latest"] = times.max().isoformat()
+
+    def total(self, *event_types):
+        return sum(n for event_type in event_types
+                   for n in self.rollups.get(event_type, {})
+                                        .get("day", {}).values())
+
+    def counts(self, event_type, granularity="day"):
+        """Numbers of the events of the `event_type` by period."""
+        return pd.Series(
+            self.rollups.get(event_type, {}).get(granularity, {}),
+            dtype=int)
+
+    def save(self):
+        with open(self.path, "w") as f:
+            f.write(json.dumps(self.rollups))
@@ -0,0 +1,62 @@
+"""Reading the records of the Odoo models through the JSON-RPC of the website."""
+import itertools
+import urllib.parse
+
+from .fetch import raise_on_failure, send_with_retries
+
+
+class RPCError(Exception):
+    pass
+
+
+class JSONRPCClient:
+    """Calls the methods of the models on behalf of the logged in `session`.
+
+    The calls go to the `/web/dataset/call_kw` endpoint of the website at
+    the `base_url`, within the budget of the optional `fetch.RateLimiter`,
+    and they are retried like the pages of the `fetch.Fetcher`, see
+    `fetch.send_with_retries`.
+    """
+
+    def __init__(self, session, base_url, rate_limiter=None, metrics=None,
+                 retries=3, backoff=1):
+        self.session = session
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.retries = retries
+        self.backoff = backoff
+        self._ids = itertools.count(1)
+
+    def call_kw(self, model, method, args, kwargs=None):
+        url = urllib.parse.urljoin(self.base_url,
+                                   f"/web/dataset/call_kw/{model}/{method}")
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "params": {"model": model, "method": method, "args": args,
+                       "kwargs": kwargs or {}},
+            "id": next(self._ids),
+        }
+        response = send_with_retries(
+            lambda: self.session.post(url, json=payload), self.rate_limiter,
+            self.retries, self.backoff, self.metrics)
+        result = raise_on_failure(response).json()
+
+        if "error" in result:
+            error = result["error"]
+            raise RPCError(error.get("data", {}).get("message")
+                           or error.get("message"))
+        return result["result"]
+
+    def read(self, model, ids, fields):
+        """Records of the `ids` with the `fields`, by ID.
+
+        The records missing or not readable by the user are left out.
+        """
+        return {
+            record["id"]: record
+            for record in self.call_kw(model, "search_read",
+                                       [[["id", "in", list(ids)]]],
+                                       {"fields": fields})
+        }
@@ -0,0 +1,129 @@
+"""Stores of the collected records and of the contents of the posts."""
+import gzip
+import hashlib
+import json
+
+from .records import to_dict
+
+
+class BlobStore:
+    """Contents stored once, gzip compressed, under their SHA-256 hash."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, content_hash):
+        return self.directory / f"{content_hash}.html.gz"
+
+    def put(self, content):
+        content = content.encode()
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self._path(content_hash)
+        if not path.is_file():
+            path.with_suffix(".tmp").write_bytes(gzip.compress(content))
+            path.with_suffix(".tmp").replace(path)
+        return content_hash
+
+    def get(self, content_hash):
+        return gzip.decompress(self._path(content_hash).read_bytes()).decode()
+
+
+class JSONLStore:
+    """Records appended to a JSON Lines file as they come, keyed by "URL".
+
+    The keys of the completed records are written into the checkpoint file
+    and only the file offsets of the records are kept in memory.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.checkpoint_path = path.with_suffix(".checkpoint")
+        self.offsets = {}
+
+        if not resume:
+            self.path.unlink(missing_ok=True)
+            self.checkpoint_path.unlink(missing_ok=True)
+        elif self.checkpoint_path.is_file():
+            completed = set(self.checkpoint_path.read_text().split())
+            with open(self.path, "rb+") as f:
+                for line in iter(f.readline, b""):
+                    try:
+                        key = json.loads(line)["URL"]
+                    except ValueError:
+                        continue  # the record interrupted while written
+                    if key in completed:
+                        self.offsets[key] = f.tell() - len(line)
+                if line and not line.endswith(b"\n"):
+                    f.write(b"\n")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def get(self, key, default=None):
+        if key not in self.offsets:
+            return default
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[key])
+            return json.loads(f.readline())
+
+    def append(self, record):
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(json.dumps(record).encode() + b"\n")
+        with open(self.checkpoint_path, "a") as f:
+            f.write(record["URL"] + "\n")
+        self.offsets[record["URL"]] = offset
+
+
+def write_json_list(f, records):
+    f.write("[")
+    for i, record in enumerate(records):
+        f.write(", " if i else "")
+        f.write(json.dumps(record))
+    f.write("]")
+
+
+def write_table(df, path):
+    if path.suffix == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(path)
+
+
+def read_table(path, columns=None):
+    import pandas as pd
+
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def write_post_tables(user_data_dir, columnar_format, question_card_urls,
+                      answer_urls, post_records):
+    """Save the questions and answers as flat `columnar_format` tables."""
+    import pandas as pd
+
+    questions_table = pd.DataFrame([
+        {"section": section_name, **to_dict(post_records.question(q_url))}
+        for section_name, q_urls in question_card_urls.items()
+        for q_url in q_urls if q_url in post_records
+    ], columns=["section", "URL", "time", "votes", "title", "content_hash"])
+    questions_table["section"] = pd.Categorical(
+        questions_table["section"], categories=list(question_card_urls))
+
+    answers_table = pd.json_normalize(
+        [to_dict(post_records.answer(a_url))
+         for a_url in answer_urls if a_url in post_records], sep="_"
+    ).reindex(columns=[
+        "URL", "time", "votes", "accepted", "content_hash",
+        "answered_question_time", "answered_question_votes",
+        "answered_question_title", "answered_question_content_hash",
+    ])
+
+    write_table(questions_table,
+                user_data_dir/f"questions.{columnar_format}")
+    write_table(answers_table, user_data_dir/f"answers.{columnar_format}")
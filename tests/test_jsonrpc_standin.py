@@ -0,0 +1,14 @@
+"""The collection via JSON-RPC against the stand-in of the forum website."""
+from jsonrpc_standin import run_collection
+
+
+def test_collection():
+    assert run_collection(250) == []
+
+
+def test_call_failing_once_is_retried():
+    assert run_collection(250, failing_calls=1) == []
+
+
+def test_batch_failing_every_retry_is_read_again_by_follow_up_pass():
+    assert run_collection(250, failing_calls=2, retries=2) == []
@@ -16,24 +16,20 @@ export JUPYTER_CONFIG_DIR="${SCRIPT_DIR}/.jupyter"
 DOCS_DIR="${SCRIPT_DIR}/docs"
 
 
-##
-# Generate HTML
-##
-"${ENV_BIN}jupyter-nbconvert" "${NOTEBOOK_NAME}" \
-  --config "${JUPYTER_CONFIG_DIR}/jupyter_lab_config.py" \
-  --to html --output-dir="${DOCS_DIR}" --output="index" --template OGP_classic
-
-
 ##
 # Update the `images/` folder
 ##
 cp -rf images/ "${DOCS_DIR}"
 
 ##
-# Generate PDF
+# Generate HTML and PDF
+#
+# Only the targets whose inputs (the notebook outputs, the template) changed
+# since the previous run are converted, concurrently.
 ##
-"${ENV_BIN}jupyter-nbconvert" "${NOTEBOOK_NAME}" \
-  --embed-images --to pdf --output-dir="${DOCS_DIR}"
+"${ENV_BIN}python" "${SCRIPT_DIR}/build_docs.py" "${NOTEBOOK_NAME}" \
+  --output-dir="${DOCS_DIR}" --template OGP_classic \
+  --config "${JUPYTER_CONFIG_DIR}/jupyter_lab_config.py" || exit 1
 
 
 ##